@@ -17,6 +17,12 @@ load_dotenv()
 from src.pipeline import PhysicianNotetakerPipeline
 
 
+def read_transcript(transcript_path: Path) -> str:
+    """Read a non-empty transcript file as UTF-8 text"""
+    with open(transcript_path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
 def main():
     parser = argparse.ArgumentParser(
         description='Process medical transcripts and generate analysis',
@@ -64,15 +70,19 @@ Examples:
         print(f"Error: File '{args.filename}' not found.")
         sys.exit(1)
     
+    # Check for an empty file before reading it
+    if transcript_path.stat().st_size == 0:
+        print("Error: Transcript file is empty.")
+        sys.exit(1)
+    
     # Read transcript
     try:
-        with open(transcript_path, 'r', encoding='utf-8') as f:
-            transcript = f.read()
+        transcript = read_transcript(transcript_path)
     except Exception as e:
         print(f"Error reading file: {e}")
         sys.exit(1)
     
-    if not transcript.strip():
+    if transcript.isspace():
         print("Error: Transcript file is empty.")
         sys.exit(1)
     
@@ -91,29 +101,28 @@ Examples:
     print("Processing... (this may take a few moments)\n")
     
     try:
-        results = pipeline.process_transcript(
-            transcript, 
-            include_soap=not args.no_soap
-        )
+        with pipeline:
+            results = pipeline.process_transcript(
+                transcript, 
+                include_soap=not args.no_soap
+            )
     except Exception as e:
         print(f"Error during processing: {e}")
         sys.exit(1)
     
-    # Generate output
-    output = pipeline.export_results(results, format_type=args.format)
-    
-    # Display results
+    # Display results, streamed straight to stdout
     print("=" * 60)
     print("RESULTS")
     print("=" * 60)
-    print(output)
+    pipeline.write_results(results, sys.stdout, format_type=args.format)
+    print()
     
     # Save to file if specified
     if args.output:
         output_path = Path(args.output)
         try:
             with open(output_path, 'w', encoding='utf-8') as f:
-                f.write(output)
+                pipeline.write_results(results, f, format_type=args.format)
             print(f"\nResults saved to: {output_path}")
         except Exception as e:
             print(f"Error saving file: {e}")
@@ -0,0 +1,132 @@
+"""
+Append-Only Cache Log
+Persists cache entries from a background writer thread so callers never block on disk I/O
+"""
+
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from typing import Any, Dict, Iterator
+
+
+class CacheLog:
+    """JSON-lines append-only log written asynchronously with batched fsync"""
+    
+    def __init__(self, path: str, fsync_interval: float = 0.1):
+        """
+        Initialize cache log
+        
+        Args:
+            path: Log file; created (with its directory) on first write
+            fsync_interval: Minimum seconds between fsync calls; writes queued in between share one fsync
+        """
+        self.path = path
+        self.fsync_interval = fsync_interval
+        self._queue = queue.Queue()
+        self._file_lock = threading.Lock()
+        self._file = None
+        self._closed = False
+        self._writer = threading.Thread(target=self._run, name="cache-log-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+    
+    def append(self, record: Dict[str, Any]) -> None:
+        """
+        Queue a record for persistence without waiting for the disk
+        
+        Args:
+            record: JSON-serializable record
+        """
+        if not self._closed:
+            self._queue.put(json.dumps(record, separators=(",", ":")))
+    
+    def flush(self) -> None:
+        """Block until every queued record has been written and fsynced"""
+        self._queue.join()
+    
+    def replay(self) -> Iterator[Dict[str, Any]]:
+        """
+        Read back persisted records in write order
+        
+        Yields:
+            Records; torn lines left by a crash mid-write are skipped
+        """
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+    
+    def truncate(self) -> None:
+        """Discard all persisted records (after they have been compacted elsewhere)"""
+        self.flush()
+        with self._file_lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            if os.path.exists(self.path):
+                os.remove(self.path)
+    
+    def close(self) -> None:
+        """Write out remaining records and stop the writer thread"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._writer.join()
+        with self._file_lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+    
+    def _open(self):
+        """Return the log file handle, opening it in append mode if needed"""
+        if self._file is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(self.path, "a+", encoding="utf-8")
+            # Terminate a torn line left by a crash so new records start cleanly
+            if self._file.tell() > 0:
+                self._file.seek(self._file.tell() - 1)
+                if self._file.read(1) != "\n":
+                    self._file.write("\n")
+        return self._file
+    
+    def _run(self) -> None:
+        """Writer loop: drain the queue, write lines and fsync at most once per interval"""
+        last_sync = 0.0
+        pending = 0
+        while True:
+            timeout = None if not pending else max(self.fsync_interval - (time.monotonic() - last_sync), 0)
+            try:
+                line = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                line = ""
+            
+            stop = line is None
+            if line:
+                with self._file_lock:
+                    f = self._open()
+                    f.write(line + "\n")
+                pending += 1
+            
+            if pending and (stop or time.monotonic() - last_sync >= self.fsync_interval):
+                with self._file_lock:
+                    if self._file is not None:
+                        self._file.flush()
+                        os.fsync(self._file.fileno())
+                for _ in range(pending):
+                    self._queue.task_done()
+                pending = 0
+                last_sync = time.monotonic()
+            
+            if stop:
+                self._queue.task_done()
+                return
@@ -0,0 +1,91 @@
+"""
+Cached Transcript-to-JSON Generation
+Shared plumbing for generators that turn a transcript into a validated JSON document
+"""
+
+import copy
+import hashlib
+from typing import Any, Callable, Dict, Optional, Tuple
+from .gemini_client import GeminiClient, default_gemini_client
+from .semantic_cache import SemanticCache
+from .utils import normalize_transcript
+
+
+def _fingerprint(cache_text: str) -> str:
+    """Exact-match fingerprint of a normalized transcript"""
+    return hashlib.sha256(cache_text.encode("utf-8")).hexdigest()
+
+
+class CachedGenerator:
+    """Base class for transcript-level JSON generators fronted by an optional semantic cache"""
+    
+    __slots__ = ("client", "semantic_cache")
+    
+    def __init__(
+        self,
+        gemini_client: Optional[GeminiClient] = None,
+        semantic_cache: Optional[SemanticCache] = None
+    ):
+        """
+        Initialize generator
+        
+        Args:
+            gemini_client: GeminiClient instance. If None, uses the shared default client.
+            semantic_cache: Cache returning results for previously seen transcripts. If None, caching is disabled.
+        """
+        self.client = gemini_client or default_gemini_client()
+        self.semantic_cache = semantic_cache
+    
+    def _generate_cached(
+        self,
+        transcript: str,
+        prompt: str,
+        temperature: float,
+        validate: Callable[[Dict[str, Any]], Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """Serve a transcript from the cache, or generate, validate and store its result"""
+        cache_text, cached = self._lookup_cache(transcript)
+        if cached is not None:
+            return cached
+        
+        result = self.client.generate_json(prompt, temperature=temperature)
+        return self._store_result(cache_text, validate(result))
+    
+    async def _agenerate_cached(
+        self,
+        transcript: str,
+        prompt: str,
+        temperature: float,
+        validate: Callable[[Dict[str, Any]], Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """Async variant of _generate_cached"""
+        cache_text, cached = self._lookup_cache(transcript)
+        if cached is not None:
+            return cached
+        
+        result = await self.client.agenerate_json(prompt, temperature=temperature)
+        return self._store_result(cache_text, validate(result))
+    
+    def _lookup_cache(self, transcript: str) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+        """Return (cache key text, copy of the cached result or None) for the semantic cache"""
+        if self.semantic_cache is None:
+            return None, None
+        cache_text = normalize_transcript(transcript)
+        entry = self.semantic_cache.get(cache_text)
+        
+        # Similarity only nominates a candidate: a transcript differing in a single detail
+        # (side, drug, dose, negation) can still score above the threshold, so clinical
+        # results are reused only for the exact same normalized transcript
+        if not isinstance(entry, dict) or entry.get("fingerprint") != _fingerprint(cache_text):
+            return cache_text, None
+        return cache_text, copy.deepcopy(entry["result"])
+    
+    def _store_result(self, cache_text: Optional[str], validated: Dict[str, Any]) -> Dict[str, Any]:
+        """Store a copy of a validated result in the semantic cache (if enabled) and return it"""
+        if cache_text is not None:
+            # Cache a private copy so callers editing the returned result cannot alter later hits
+            self.semantic_cache.set(
+                cache_text,
+                {"fingerprint": _fingerprint(cache_text), "result": copy.deepcopy(validated)}
+            )
+        return validated
@@ -4,22 +4,251 @@ Handles API key management, prompt templates, and error handling
 """
 
 import os
+import re
 import json
-import time
-from typing import Dict, Any, Optional
+import hashlib
+import threading
+from functools import cache, lru_cache
+from typing import Dict, Any, Iterator, Optional, Tuple
 import google.generativeai as genai
 from google.generativeai.types import HarmCategory, HarmBlockThreshold
+from google.api_core import exceptions as google_exceptions
+from tenacity import (
+    AsyncRetrying,
+    Retrying,
+    retry_if_exception_type,
+    stop_after_attempt,
+    wait_exponential_jitter,
+)
+from .response_cache import ResponseCache
+
+MAX_OUTPUT_TOKENS = 8192
+
+# Use gemini-2.5-flash as originally requested (user specified gemini-2.5-flash),
+# falling back to gemini-2.0-flash-exp and then gemini-2.0-flash if not available
+MODEL_CANDIDATES = ('gemini-2.5-flash', 'gemini-2.0-flash-exp', 'gemini-2.0-flash')
+
+# Response type for JSON mode: Gemini enforces syntactically valid JSON server-side
+JSON_MIME_TYPE = "application/json"
+
+# Transient API errors worth retrying; anything else (auth, invalid argument) fails immediately
+RETRYABLE_ERRORS = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.ServiceUnavailable,
+)
+
+# Upper bound on a single backoff wait, in seconds
+MAX_RETRY_DELAY = 8.0
+
+# Gemini rejects context caches below a minimum token count (~1024 tokens);
+# skip the create call for content that is clearly too short (~4 chars per token)
+MIN_CONTEXT_CACHE_CHARS = 4096
+
+# Responses are only cached for (near-)deterministic sampling
+MAX_CACHEABLE_TEMPERATURE = 0.3
+
+
+# Appended to every JSON prompt
+JSON_INSTRUCTION = "\n\nIMPORTANT: Respond ONLY with valid JSON. Do not include any markdown formatting, code blocks, or explanatory text."
+
+# Markdown code fence around a JSON response, stripped only if direct parsing fails
+_CODE_FENCE_PATTERN = re.compile(r'^\s*```(?:json)?\s*|\s*```\s*$')
+
+# Start of a top-level "key": member in a streamed JSON object (after an optional comma)
+_JSON_MEMBER_PATTERN = re.compile(r'\s*,?\s*("(?:[^"\\]|\\.)*")\s*:\s*')
+
+
+# Prompt templates. Transcript-level prompts are built as the transcript context
+# followed by static instructions, so the varying part is the only thing rebuilt per call.
+_TRANSCRIPT_PREFIX = "Physician-patient conversation transcript:\n"
+
+_NER_INSTRUCTIONS = """You are a medical NLP expert. Extract medical entities from the physician-patient conversation transcript above.
+
+Extract the following information:
+1. Patient Name (if mentioned)
+2. Symptoms (list all symptoms mentioned)
+3. Diagnosis (medical diagnosis if stated)
+4. Treatment (treatments, medications, procedures mentioned)
+5. Prognosis (expected outcome or recovery timeline)
+6. Current Status (patient's current condition)
+
+Return a JSON object with the following structure:
+{
+  "Patient_Name": "string or null",
+  "Symptoms": ["symptom1", "symptom2"],
+  "Diagnosis": "string or null",
+  "Treatment": ["treatment1", "treatment2"],
+  "Current_Status": "string",
+  "Prognosis": "string or null"
+}
+
+If information is not available or ambiguous, use null for strings or empty arrays for lists."""
+
+_SUMMARIZATION_INSTRUCTIONS = """You are a medical transcription expert. Summarize the provided physician-patient conversation into a structured medical report.
+
+Create a comprehensive summary that includes:
+- Patient demographics (if mentioned)
+- Chief complaint
+- History of present illness
+- Key symptoms and timeline
+- Previous treatments
+- Current status
+- Medical findings
+
+Return a JSON object with structured medical information."""
+
+_SOAP_SECTIONS = """SOAP stands for:
+- Subjective: Patient's reported symptoms and history
+- Objective: Observable findings, physical exam results
+- Assessment: Diagnosis and clinical assessment
+- Plan: Treatment plan and follow-up"""
+
+_SOAP_NOTE_SCHEMA = """{
+  "Subjective": {
+    "Chief_Complaint": "string",
+    "History_of_Present_Illness": "string"
+  },
+  "Objective": {
+    "Physical_Exam": "string",
+    "Observations": "string"
+  },
+  "Assessment": {
+    "Diagnosis": "string",
+    "Severity": "string"
+  },
+  "Plan": {
+    "Treatment": "string",
+    "Follow-Up": "string"
+  }
+}"""
+
+_SOAP_INSTRUCTIONS = (
+    "You are a medical documentation expert. Convert the provided physician-patient "
+    "conversation into a structured SOAP note.\n\n"
+    + _SOAP_SECTIONS
+    + "\n\nReturn a JSON object with this exact structure:\n"
+    + _SOAP_NOTE_SCHEMA
+    + '\n\nIf information is not available in the transcript, use "Not documented" for that field.'
+)
+
+# Batch variant: the per-note schema nested under "notes", so the structure the model is
+# told to return matches what generate_soap_notes_batch expects
+_SOAP_BATCH_INSTRUCTIONS = (
+    "You are a medical documentation expert. Convert each of the numbered physician-patient "
+    "conversations above into its own structured SOAP note.\n\n"
+    + _SOAP_SECTIONS
+    + '\n\nReturn a JSON object with this exact structure, with one entry in "notes" per '
+    "transcript, in the same order as the transcripts:\n"
+    + '{\n  "notes": [\n'
+    + "\n".join("    " + line for line in _SOAP_NOTE_SCHEMA.split("\n"))
+    + "\n  ]\n}"
+    + '\n\nIf information is not available in a transcript, use "Not documented" for that field.'
+)
+
+_COMBINED_INTRO = """You are a medical NLP and documentation expert. Analyze the physician-patient conversation transcript above and produce all of the requested outputs in a single response.
+
+Produce:
+1. Medical_NER: medical entities (patient name, symptoms, diagnosis, treatment, current status, prognosis)
+2. Keywords: the 10 most important medical keywords or phrases (medical terms, symptoms, treatments, clinical findings)
+3. Summarization: a structured medical report (demographics, chief complaint, history of present illness, symptoms and timeline, previous treatments, current status, medical findings)"""
+
+_COMBINED_SCHEMA = """  "Medical_NER": {
+    "Patient_Name": "string or null",
+    "Symptoms": ["symptom1", "symptom2"],
+    "Diagnosis": "string or null",
+    "Treatment": ["treatment1", "treatment2"],
+    "Current_Status": "string",
+    "Prognosis": "string or null"
+  },
+  "Keywords": ["keyword1", "keyword2"],
+  "Summarization": {
+    "Patient_Demographics": {
+      "Name": "string or null",
+      "Age": "string or null",
+      "Gender": "string or null"
+    },
+    "Chief_Complaint": "string",
+    "History_of_Present_Illness": "string",
+    "Symptoms": {
+      "Primary": ["symptom1", "symptom2"],
+      "Secondary": ["symptom1", "symptom2"],
+      "Timeline": "string description"
+    },
+    "Previous_Treatments": ["treatment1", "treatment2"],
+    "Current_Status": "string",
+    "Medical_Findings": "string",
+    "Clinical_Notes": "string"
+  }"""
+
+_COMBINED_INSTRUCTIONS = (
+    _COMBINED_INTRO
+    + "\n4. SOAP_Note: a structured SOAP note (Subjective, Objective, Assessment, Plan)"
+    + "\n\nReturn a JSON object with this exact structure:\n{\n"
+    + _COMBINED_SCHEMA
+    + ',\n  "SOAP_Note": '
+    + "\n  ".join(_SOAP_NOTE_SCHEMA.split("\n"))
+    + "\n}"
+    + "\n\nFor Medical_NER and Summarization, use null for unavailable strings or empty arrays "
+    'for lists. For SOAP_Note, use "Not documented" for any field not available in the transcript.'
+)
+
+# Variant without the SOAP note, so runs that skip it do not pay for its output tokens
+_COMBINED_NO_SOAP_INSTRUCTIONS = (
+    _COMBINED_INTRO
+    + "\n\nReturn a JSON object with this exact structure:\n{\n"
+    + _COMBINED_SCHEMA
+    + "\n}"
+    + "\n\nUse null for unavailable strings or empty arrays for lists."
+)
+
+
+@lru_cache(maxsize=8)
+def _make_gen_config(
+    temperature: float,
+    response_mime_type: Optional[str] = None
+) -> genai.types.GenerationConfig:
+    """Build (and reuse) the generation config for a given temperature and response type"""
+    if response_mime_type is None:
+        return genai.types.GenerationConfig(
+            temperature=temperature,
+            max_output_tokens=MAX_OUTPUT_TOKENS,
+        )
+    return genai.types.GenerationConfig(
+        temperature=temperature,
+        max_output_tokens=MAX_OUTPUT_TOKENS,
+        response_mime_type=response_mime_type,
+    )
+
+
+def _chunk_text(chunk: Any) -> str:
+    """Return the text of a streamed chunk, or "" for chunks without parts"""
+    # chunk.text raises on chunks that carry no parts (e.g. a SAFETY or MAX_TOKENS finish),
+    # so read the first candidate's parts directly
+    candidates = getattr(chunk, "candidates", None)
+    if not candidates:
+        return ""
+    parts = getattr(candidates[0].content, "parts", None) or ()
+    return "".join(getattr(part, "text", "") or "" for part in parts)
 
 
 class GeminiClient:
     """Wrapper class for Google Gemini 2.5 Flash API"""
     
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        enable_cache: bool = True,
+        cache_path: Optional[str] = None
+    ):
         """
         Initialize Gemini client
         
         Args:
             api_key: Google Gemini API key. If None, reads from GEMINI_API_KEY env var
+            enable_cache: Whether to cache responses for identical low-temperature prompts
+            cache_path: SQLite file for persisting cached responses across runs.
+                If None, reads from GEMINI_CACHE_PATH env var; memory-only if unset
         """
         self.api_key = api_key or os.getenv("GEMINI_API_KEY")
         if not self.api_key:
@@ -29,17 +258,7 @@ class GeminiClient:
             )
         
         genai.configure(api_key=self.api_key)
-        # Use gemini-2.5-flash as originally requested (user specified gemini-2.5-flash)
-        # This is the latest stable flash model available
-        try:
-            self.model = genai.GenerativeModel('gemini-2.5-flash')
-        except Exception:
-            # Fallback to gemini-2.0-flash-exp if 2.5 not available
-            try:
-                self.model = genai.GenerativeModel('gemini-2.0-flash-exp')
-            except Exception:
-                # Final fallback to gemini-2.0-flash
-                self.model = genai.GenerativeModel('gemini-2.0-flash')
+        self.model = self._create_model()
         
         # Configure safety settings for medical content
         self.safety_settings = {
@@ -48,48 +267,163 @@ class GeminiClient:
             HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
             HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
         }
+        
+        # Exact-match response cache
+        self._cache = None
+        if enable_cache:
+            self._cache = ResponseCache(path=cache_path or os.getenv("GEMINI_CACHE_PATH"))
+        
+        # Server-side context caches, keyed by the transcript prefix they hold
+        self._context_models = {}
+        self._context_lock = threading.Lock()
+    
+    def _create_model(self) -> genai.GenerativeModel:
+        """Instantiate the Gemini model, honouring the GEMINI_MODEL override"""
+        override = os.getenv("GEMINI_MODEL")
+        if override:
+            return genai.GenerativeModel(override)
+        
+        for i, name in enumerate(MODEL_CANDIDATES):
+            try:
+                return genai.GenerativeModel(name)
+            except Exception:
+                if i == len(MODEL_CANDIDATES) - 1:
+                    raise
+    
+    def _cache_key(
+        self,
+        namespace: str,
+        prompt: str,
+        temperature: float,
+        response_mime_type: Optional[str] = None
+    ) -> Optional[str]:
+        """Build a cache key for a prompt, or None if the call should not be cached"""
+        if self._cache is None or temperature > MAX_CACHEABLE_TEMPERATURE:
+            return None
+        raw = f"{self.model.model_name}|{temperature}|{MAX_OUTPUT_TOKENS}|{response_mime_type}|{prompt}"
+        return f"{namespace}:{hashlib.sha256(raw.encode('utf-8')).hexdigest()}"
+    
+    def create_transcript_cache(self, transcript: str, ttl: int = 300) -> Optional[Any]:
+        """
+        Cache the transcript prefix server-side so prompts built on it only send their instructions
+        
+        Args:
+            transcript: Raw transcript shared by subsequent prompts
+            ttl: Cache lifetime in seconds
+        
+        Returns:
+            CachedContent handle, or None if context caching is unavailable
+            (e.g. the transcript is below the model's minimum cacheable size)
+        """
+        prefix = self.get_transcript_context(transcript)
+        if len(prefix) < MIN_CONTEXT_CACHE_CHARS:
+            return None
+        
+        try:
+            handle = genai.caching.CachedContent.create(
+                model=self.model.model_name,
+                contents=[prefix],
+                ttl=f"{ttl}s",
+            )
+            model = genai.GenerativeModel.from_cached_content(cached_content=handle)
+        except Exception:
+            return None
+        
+        with self._context_lock:
+            self._context_models[prefix] = (handle, model)
+        return handle
+    
+    def delete_transcript_cache(self, handle: Any) -> None:
+        """
+        Delete a context cache created by create_transcript_cache
+        
+        Args:
+            handle: CachedContent handle
+        """
+        with self._context_lock:
+            for prefix, (cached, _) in list(self._context_models.items()):
+                if cached is handle:
+                    del self._context_models[prefix]
+        try:
+            handle.delete()
+        except Exception:
+            # Cache expires on its own after its TTL
+            pass
+    
+    def _resolve_model(self, prompt: str):
+        """Return the model and contents to send, using a context cache if one holds the prompt prefix"""
+        with self._context_lock:
+            for prefix, (_, model) in self._context_models.items():
+                if prompt.startswith(prefix):
+                    return model, prompt[len(prefix):]
+        return self.model, prompt
     
     def generate_text(
         self,
         prompt: str,
-        max_retries: int = 3,
-        retry_delay: float = 1.0,
-        temperature: float = 0.3
+        max_retries: int = 4,
+        retry_delay: float = 0.5,
+        temperature: float = 0.3,
+        use_cache: bool = True,
+        response_mime_type: Optional[str] = None
     ) -> str:
         """
         Generate text using Gemini API with retry logic
         
         Args:
             prompt: Input prompt for the model
-            max_retries: Maximum number of retry attempts
-            retry_delay: Delay between retries in seconds
+            max_retries: Maximum number of attempts on transient API errors
+            retry_delay: Initial backoff delay in seconds (grows exponentially, with jitter)
             temperature: Sampling temperature (0.0-1.0)
+            use_cache: Whether to serve and store the response in the response cache
+            response_mime_type: Output MIME type to enforce (e.g. "application/json")
         
         Returns:
             Generated text response
         """
-        for attempt in range(max_retries):
-            try:
-                response = self.model.generate_content(
-                    prompt,
-                    safety_settings=self.safety_settings,
-                    generation_config=genai.types.GenerationConfig(
-                        temperature=temperature,
-                        max_output_tokens=8192,
-                    )
-                )
-                return response.text
-            except Exception as e:
-                if attempt < max_retries - 1:
-                    time.sleep(retry_delay * (attempt + 1))
-                    continue
-                raise Exception(f"Failed to generate text after {max_retries} attempts: {str(e)}")
+        cache_key = self._cache_key("text", prompt, temperature, response_mime_type) if use_cache else None
+        if cache_key is not None:
+            cached = self._cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
+        model, contents = self._resolve_model(prompt)
+        
+        retrying = Retrying(
+            stop=stop_after_attempt(max_retries),
+            wait=wait_exponential_jitter(initial=retry_delay, max=MAX_RETRY_DELAY),
+            retry=retry_if_exception_type(RETRYABLE_ERRORS),
+            reraise=True,
+        )
+        try:
+            text = retrying(self._generate_once, model, contents, temperature, response_mime_type)
+        except RETRYABLE_ERRORS as e:
+            raise Exception(f"Failed to generate text after {max_retries} attempts: {str(e)}")
+        
+        if cache_key is not None:
+            self._cache.set(cache_key, text)
+        return text
+    
+    def _generate_once(
+        self,
+        model: Any,
+        contents: str,
+        temperature: float,
+        response_mime_type: Optional[str]
+    ) -> str:
+        """Issue a single generate_content call"""
+        response = model.generate_content(
+            contents,
+            safety_settings=self.safety_settings,
+            generation_config=_make_gen_config(temperature, response_mime_type)
+        )
+        return response.text
     
     def generate_json(
         self,
         prompt: str,
         max_retries: int = 3,
-        retry_delay: float = 1.0,
+        retry_delay: float = 0.5,
         temperature: float = 0.2
     ) -> Dict[str, Any]:
         """
@@ -97,55 +431,283 @@ class GeminiClient:
         
         Args:
             prompt: Input prompt with JSON format instructions
-            max_retries: Maximum number of retry attempts
-            retry_delay: Delay between retries in seconds
+            max_retries: Maximum number of attempts on unparseable responses
+            retry_delay: Initial backoff delay in seconds (grows exponentially, with jitter)
             temperature: Sampling temperature (lower for more deterministic JSON)
         
         Returns:
             Parsed JSON dictionary
         """
-        json_prompt = f"{prompt}\n\nIMPORTANT: Respond ONLY with valid JSON. Do not include any markdown formatting, code blocks, or explanatory text."
+        json_prompt = prompt + JSON_INSTRUCTION
         
-        for attempt in range(max_retries):
-            try:
-                response_text = self.generate_text(json_prompt, max_retries=1, temperature=temperature)
+        # Results are cached under their own key so a hit skips the API call and the parse
+        # retries. The cache decodes a fresh copy on every hit (a json.loads of the stored
+        # text, cheaper than deepcopying the parsed object), so callers may mutate it
+        cache_key = self._cache_key("json", json_prompt, temperature, JSON_MIME_TYPE)
+        if cache_key is not None:
+            cached = self._cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
+        retrying = Retrying(
+            stop=stop_after_attempt(max_retries),
+            wait=wait_exponential_jitter(initial=retry_delay, max=MAX_RETRY_DELAY),
+            retry=retry_if_exception_type(json.JSONDecodeError),
+            reraise=True,
+        )
+        try:
+            result = retrying(self._generate_json_once, json_prompt, temperature)
+        except json.JSONDecodeError as e:
+            raise Exception(f"Failed to parse JSON response after {max_retries} attempts: {str(e)}")
+        
+        if cache_key is not None:
+            self._cache.set(cache_key, result)
+        return result
+    
+    async def agenerate_text(
+        self,
+        prompt: str,
+        max_retries: int = 4,
+        retry_delay: float = 0.5,
+        temperature: float = 0.3,
+        use_cache: bool = True,
+        response_mime_type: Optional[str] = None
+    ) -> str:
+        """
+        Async variant of generate_text, for dispatching many requests concurrently
+        
+        Args:
+            prompt: Input prompt for the model
+            max_retries: Maximum number of attempts on transient API errors
+            retry_delay: Initial backoff delay in seconds (grows exponentially, with jitter)
+            temperature: Sampling temperature (0.0-1.0)
+            use_cache: Whether to serve and store the response in the response cache
+            response_mime_type: Output MIME type to enforce (e.g. "application/json")
+        
+        Returns:
+            Generated text response
+        """
+        cache_key = self._cache_key("text", prompt, temperature, response_mime_type) if use_cache else None
+        if cache_key is not None:
+            cached = self._cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
+        model, contents = self._resolve_model(prompt)
+        
+        retrying = AsyncRetrying(
+            stop=stop_after_attempt(max_retries),
+            wait=wait_exponential_jitter(initial=retry_delay, max=MAX_RETRY_DELAY),
+            retry=retry_if_exception_type(RETRYABLE_ERRORS),
+            reraise=True,
+        )
+        try:
+            text = await retrying(self._agenerate_once, model, contents, temperature, response_mime_type)
+        except RETRYABLE_ERRORS as e:
+            raise Exception(f"Failed to generate text after {max_retries} attempts: {str(e)}")
+        
+        if cache_key is not None:
+            self._cache.set(cache_key, text)
+        return text
+    
+    async def _agenerate_once(
+        self,
+        model: Any,
+        contents: str,
+        temperature: float,
+        response_mime_type: Optional[str]
+    ) -> str:
+        """Issue a single async generate_content call"""
+        response = await model.generate_content_async(
+            contents,
+            safety_settings=self.safety_settings,
+            generation_config=_make_gen_config(temperature, response_mime_type)
+        )
+        return response.text
+    
+    async def agenerate_json(
+        self,
+        prompt: str,
+        max_retries: int = 3,
+        retry_delay: float = 0.5,
+        temperature: float = 0.2
+    ) -> Dict[str, Any]:
+        """
+        Async variant of generate_json, for dispatching many requests concurrently
+        
+        Args:
+            prompt: Input prompt with JSON format instructions
+            max_retries: Maximum number of attempts on unparseable responses
+            retry_delay: Initial backoff delay in seconds (grows exponentially, with jitter)
+            temperature: Sampling temperature (lower for more deterministic JSON)
+        
+        Returns:
+            Parsed JSON dictionary
+        """
+        json_prompt = prompt + JSON_INSTRUCTION
+        
+        cache_key = self._cache_key("json", json_prompt, temperature, JSON_MIME_TYPE)
+        if cache_key is not None:
+            cached = self._cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
+        retrying = AsyncRetrying(
+            stop=stop_after_attempt(max_retries),
+            wait=wait_exponential_jitter(initial=retry_delay, max=MAX_RETRY_DELAY),
+            retry=retry_if_exception_type(json.JSONDecodeError),
+            reraise=True,
+        )
+        try:
+            result = await retrying(self._agenerate_json_once, json_prompt, temperature)
+        except json.JSONDecodeError as e:
+            raise Exception(f"Failed to parse JSON response after {max_retries} attempts: {str(e)}")
+        
+        if cache_key is not None:
+            self._cache.set(cache_key, result)
+        return result
+    
+    async def _agenerate_json_once(self, json_prompt: str, temperature: float) -> Any:
+        """Generate and parse a single JSON response asynchronously"""
+        response_text = await self.agenerate_text(
+            json_prompt,
+            temperature=temperature,
+            use_cache=False,
+            response_mime_type=JSON_MIME_TYPE
+        )
+        
+        try:
+            return json.loads(response_text)
+        except json.JSONDecodeError:
+            # Fall back to removing markdown code blocks if present
+            return json.loads(_CODE_FENCE_PATTERN.sub('', response_text))
+    
+    def stream_text(
+        self,
+        prompt: str,
+        temperature: float = 0.3,
+        response_mime_type: Optional[str] = None,
+        max_retries: int = 4,
+        retry_delay: float = 0.5
+    ) -> Iterator[str]:
+        """
+        Stream generated text as it is produced
+        
+        Args:
+            prompt: Input prompt for the model
+            temperature: Sampling temperature (0.0-1.0)
+            response_mime_type: Output MIME type to enforce (e.g. "application/json")
+            max_retries: Maximum number of attempts to open the stream on transient API errors
+            retry_delay: Initial backoff delay in seconds (grows exponentially, with jitter)
+        
+        Yields:
+            Text chunks in generation order
+        """
+        model, contents = self._resolve_model(prompt)
+        
+        # Only opening the stream is retried; once chunks have been yielded a retry
+        # would replay text the caller has already consumed
+        retrying = Retrying(
+            stop=stop_after_attempt(max_retries),
+            wait=wait_exponential_jitter(initial=retry_delay, max=MAX_RETRY_DELAY),
+            retry=retry_if_exception_type(RETRYABLE_ERRORS),
+            reraise=True,
+        )
+        try:
+            response = retrying(
+                model.generate_content,
+                contents,
+                safety_settings=self.safety_settings,
+                generation_config=_make_gen_config(temperature, response_mime_type),
+                stream=True
+            )
+        except RETRYABLE_ERRORS as e:
+            raise Exception(f"Failed to open stream after {max_retries} attempts: {str(e)}")
+        
+        for chunk in response:
+            text = _chunk_text(chunk)
+            if text:
+                yield text
+    
+    def stream_json(self, prompt: str, temperature: float = 0.2) -> Iterator[Tuple[str, Any]]:
+        """
+        Stream a JSON object response, yielding each top-level member as soon as it is complete
+        
+        Args:
+            prompt: Input prompt with JSON format instructions
+            temperature: Sampling temperature (lower for more deterministic JSON)
+        
+        Yields:
+            (key, value) pairs of the top-level object, in generation order
+        """
+        decoder = json.JSONDecoder()
+        buffer = ""
+        pos = None  # Index just past the last consumed member (or the opening brace)
+        
+        for chunk in self.stream_text(
+            prompt + JSON_INSTRUCTION,
+            temperature=temperature,
+            response_mime_type=JSON_MIME_TYPE
+        ):
+            buffer += chunk
+            while True:
+                if pos is None:
+                    start = buffer.find('{')
+                    if start < 0:
+                        break
+                    pos = start + 1
                 
-                # Clean response - remove markdown code blocks if present
-                response_text = response_text.strip()
-                if response_text.startswith("```json"):
-                    response_text = response_text[7:]
-                elif response_text.startswith("```"):
-                    response_text = response_text[3:]
-                if response_text.endswith("```"):
-                    response_text = response_text[:-3]
-                response_text = response_text.strip()
+                member = _JSON_MEMBER_PATTERN.match(buffer, pos)
+                if member is None:
+                    break
+                try:
+                    value, end = decoder.raw_decode(buffer, member.end())
+                except json.JSONDecodeError:
+                    # Value is not complete yet; wait for more chunks
+                    break
+                if end == len(buffer) and isinstance(value, (int, float)):
+                    # A number at the end of the buffer may still be growing
+                    break
                 
-                return json.loads(response_text)
-            except json.JSONDecodeError as e:
-                if attempt < max_retries - 1:
-                    time.sleep(retry_delay * (attempt + 1))
-                    continue
-                raise Exception(f"Failed to parse JSON response after {max_retries} attempts: {str(e)}")
-            except Exception as e:
-                if attempt < max_retries - 1:
-                    time.sleep(retry_delay * (attempt + 1))
-                    continue
-                raise
+                yield json.loads(member.group(1)), value
+                pos = end
     
+    def _generate_json_once(self, json_prompt: str, temperature: float) -> Any:
+        """Generate and parse a single JSON response (transient API errors are retried in generate_text)"""
+        # Bypass the text cache so a malformed response is not replayed on retry.
+        # JSON mode has Gemini guarantee syntactically valid output.
+        response_text = self.generate_text(
+            json_prompt,
+            temperature=temperature,
+            use_cache=False,
+            response_mime_type=JSON_MIME_TYPE
+        )
+        
+        try:
+            return json.loads(response_text)
+        except json.JSONDecodeError:
+            # Fall back to removing markdown code blocks if present
+            return json.loads(_CODE_FENCE_PATTERN.sub('', response_text))
+    
+    def get_transcript_context(self, transcript: str) -> str:
+        """Generate the transcript prefix shared by all transcript-level prompts"""
+        return _TRANSCRIPT_PREFIX + transcript + "\n\n"
+
     def get_medical_ner_prompt(self, transcript: str) -> str:
         """Generate prompt for medical NER extraction"""
-        return f"""You are a medical NLP expert. Extract medical entities from the following physician-patient conversation transcript.
+        return self.get_transcript_context(transcript) + _NER_INSTRUCTIONS
 
-Extract the following information:
-1. Patient Name (if mentioned)
-2. Symptoms (list all symptoms mentioned)
-3. Diagnosis (medical diagnosis if stated)
-4. Treatment (treatments, medications, procedures mentioned)
-5. Prognosis (expected outcome or recovery timeline)
-6. Current Status (patient's current condition)
+    def get_ner_merge_prompt(self, partial_results: list) -> str:
+        """Generate prompt for merging NER results extracted from transcript chunks"""
+        return f"""You are a medical NLP expert. The following JSON objects are medical entities extracted from consecutive, overlapping sections of the same physician-patient conversation.
 
-Transcript:
-{transcript}
+Partial Results:
+{json.dumps(partial_results, indent=2)}
+
+Merge them into a single result:
+- Combine Symptoms and Treatment lists, removing duplicates and near-duplicates (keep the most specific wording)
+- For Patient_Name, Diagnosis and Prognosis, use the most complete non-null value
+- For Current_Status, prefer the value from the latest section that states one
 
 Return a JSON object with the following structure:
 {{
@@ -155,27 +717,11 @@ Return a JSON object with the following structure:
   "Treatment": ["treatment1", "treatment2"],
   "Current_Status": "string",
   "Prognosis": "string or null"
-}}
-
-If information is not available or ambiguous, use null for strings or empty arrays for lists."""
+}}"""
 
     def get_summarization_prompt(self, transcript: str) -> str:
         """Generate prompt for medical text summarization"""
-        return f"""You are a medical transcription expert. Summarize the following physician-patient conversation into a structured medical report.
-
-Transcript:
-{transcript}
-
-Create a comprehensive summary that includes:
-- Patient demographics (if mentioned)
-- Chief complaint
-- History of present illness
-- Key symptoms and timeline
-- Previous treatments
-- Current status
-- Medical findings
-
-Return a JSON object with structured medical information."""
+        return self.get_transcript_context(transcript) + _SUMMARIZATION_INSTRUCTIONS
 
     def get_sentiment_prompt(self, patient_text: str) -> str:
         """Generate prompt for sentiment and intent analysis"""
@@ -195,36 +741,35 @@ Return a JSON object:
 
     def get_soap_prompt(self, transcript: str) -> str:
         """Generate prompt for SOAP note generation"""
-        return f"""You are a medical documentation expert. Convert the following physician-patient conversation into a structured SOAP note.
+        return self.get_transcript_context(transcript) + _SOAP_INSTRUCTIONS
 
-SOAP stands for:
-- Subjective: Patient's reported symptoms and history
-- Objective: Observable findings, physical exam results
-- Assessment: Diagnosis and clinical assessment
-- Plan: Treatment plan and follow-up
+    def get_soap_batch_prompt(self, transcripts: list) -> str:
+        """Generate prompt for SOAP note generation over several transcripts in one call"""
+        numbered = "\n\n".join(
+            f"[{i}] Transcript {i}:\n{transcript}" for i, transcript in enumerate(transcripts, 1)
+        )
+        return f"""Physician-patient conversation transcripts:
+{numbered}
 
-Transcript:
-{transcript}
+""" + _SOAP_BATCH_INSTRUCTIONS + f"""
 
-Return a JSON object with this exact structure:
-{{
-  "Subjective": {{
-    "Chief_Complaint": "string",
-    "History_of_Present_Illness": "string"
-  }},
-  "Objective": {{
-    "Physical_Exam": "string",
-    "Observations": "string"
-  }},
-  "Assessment": {{
-    "Diagnosis": "string",
-    "Severity": "string"
-  }},
-  "Plan": {{
-    "Treatment": "string",
-    "Follow-Up": "string"
-  }}
-}}
+The "notes" list must contain exactly {len(transcripts)} SOAP notes."""
+
+    def get_combined_analysis_prompt(self, transcript: str, include_soap: bool = True) -> str:
+        """Generate a single prompt covering NER, keywords, summarization and (optionally) SOAP note"""
+        instructions = _COMBINED_INSTRUCTIONS if include_soap else _COMBINED_NO_SOAP_INSTRUCTIONS
+        return self.get_transcript_context(transcript) + instructions
 
-If information is not available in the transcript, use "Not documented" for that field."""
 
+@cache
+def default_gemini_client() -> GeminiClient:
+    """
+    Return the process-wide GeminiClient used by components constructed without one
+    
+    Created lazily on first use from the GEMINI_API_KEY environment variable, so every
+    component shares one configured SDK transport, response cache and context-cache registry.
+    GeminiClient is safe to share across threads: the response cache and context-cache
+    registry are lock-protected and the SDK client is thread-safe. Pass an explicit client
+    to use a different API key or cache settings.
+    """
+    return GeminiClient()
@@ -4,21 +4,51 @@ Extracts Symptoms, Treatment, Diagnosis, Prognosis from medical transcripts
 """
 
 import re
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any, List, Optional
-from .gemini_client import GeminiClient
+from .gemini_client import GeminiClient, default_gemini_client
+from .utils import chunk_by_turns, ensure_list
+
+# Medical keyword patterns, combined into a single alternation compiled once at
+# import so each transcript is scanned in one pass
+MEDICAL_TERMS = [
+    'whiplash', 'injury', 'pain', 'ache', 'discomfort', 'stiffness',
+    'physiotherapy', 'therapy', 'treatment', 'medication', 'painkiller',
+    'diagnosis', 'condition', 'symptom', 'sign',
+    'recovery', 'prognosis', 'healing', 'improvement',
+    'accident', 'trauma', 'impact', 'collision',
+    'range of motion', 'mobility', 'movement', 'tenderness',
+    'follow-up', 'appointment', 'examination', 'check-up',
+]
+_MEDICAL_KW_PATTERN = re.compile(r'\b(?:' + '|'.join(MEDICAL_TERMS) + r')\b', re.IGNORECASE)
 
 
 class MedicalNER:
     """Medical NER extraction using Gemini API"""
     
-    def __init__(self, gemini_client: Optional[GeminiClient] = None):
+    def __init__(self, gemini_client: Optional[GeminiClient] = None, max_chunk_chars: int = 8000):
         """
         Initialize Medical NER
         
         Args:
-            gemini_client: GeminiClient instance. If None, creates a new one.
+            gemini_client: GeminiClient instance. If None, uses the shared default client.
+            max_chunk_chars: Transcripts longer than this are extracted chunk by chunk and merged
         """
-        self.client = gemini_client or GeminiClient()
+        self.client = gemini_client or default_gemini_client()
+        self.max_chunk_chars = max_chunk_chars
+        
+        # Executor for extracting entities from transcript chunks concurrently
+        self.executor = ThreadPoolExecutor(max_workers=4)
+    
+    def close(self) -> None:
+        """Shut down the chunk executor, waiting for running extractions to finish"""
+        self.executor.shutdown()
+    
+    def __enter__(self) -> "MedicalNER":
+        return self
+    
+    def __exit__(self, *exc_info) -> None:
+        self.close()
     
     def extract_entities(self, transcript: str) -> Dict[str, Any]:
         """
@@ -30,32 +60,47 @@ class MedicalNER:
         Returns:
             Dictionary with extracted medical entities
         """
-        prompt = self.client.get_medical_ner_prompt(transcript)
-        result = self.client.generate_json(prompt, temperature=0.2)
+        chunks = chunk_by_turns(transcript, max_chars=self.max_chunk_chars)
+        if len(chunks) == 1:
+            prompt = self.client.get_medical_ner_prompt(transcript)
+            result = self.client.generate_json(prompt, temperature=0.2)
+        else:
+            # Map: extract entities per chunk; Reduce: merge partial results in one small call
+            partials = list(self.executor.map(self._extract_chunk_entities, chunks))
+            merge_prompt = self.client.get_ner_merge_prompt(partials)
+            result = self.client.generate_json(merge_prompt, temperature=0.2)
         
         # Validate and clean the result
         return self._validate_result(result)
     
+    def _extract_chunk_entities(self, chunk: str) -> Dict[str, Any]:
+        """Extract and validate medical entities from a single transcript chunk"""
+        prompt = self.client.get_medical_ner_prompt(chunk)
+        return self._validate_result(self.client.generate_json(prompt, temperature=0.2))
+    
     def _validate_result(self, result: Dict[str, Any]) -> Dict[str, Any]:
         """Validate and clean NER extraction result"""
         validated = {
             "Patient_Name": result.get("Patient_Name") or None,
-            "Symptoms": self._ensure_list(result.get("Symptoms", [])),
+            "Symptoms": ensure_list(result.get("Symptoms", [])),
             "Diagnosis": result.get("Diagnosis") or None,
-            "Treatment": self._ensure_list(result.get("Treatment", [])),
+            "Treatment": ensure_list(result.get("Treatment", [])),
             "Current_Status": result.get("Current_Status") or "Not specified",
             "Prognosis": result.get("Prognosis") or None
         }
         return validated
     
-    def _ensure_list(self, value: Any) -> List[str]:
-        """Ensure value is a list of strings"""
-        if isinstance(value, list):
-            return [str(item).strip() for item in value if item]
-        elif isinstance(value, str):
-            return [value.strip()] if value.strip() else []
-        else:
-            return []
+    def extract_pattern_keywords(self, transcript: str) -> List[str]:
+        """
+        Extract medical keywords from transcript using pattern matching only
+        
+        Args:
+            transcript: Raw transcript
+        
+        Returns:
+            List of matched medical keywords
+        """
+        return list(set(m.lower() for m in _MEDICAL_KW_PATTERN.findall(transcript)))
     
     def extract_keywords(self, transcript: str, top_n: int = 10) -> List[str]:
         """
@@ -68,31 +113,12 @@ class MedicalNER:
         Returns:
             List of important medical keywords/phrases
         """
-        # Medical keyword patterns
-        medical_patterns = [
-            r'\b(whiplash|injury|pain|ache|discomfort|stiffness)\b',
-            r'\b(physiotherapy|therapy|treatment|medication|painkiller)\b',
-            r'\b(diagnosis|condition|symptom|sign)\b',
-            r'\b(recovery|prognosis|healing|improvement)\b',
-            r'\b(accident|trauma|impact|collision)\b',
-            r'\b(range of motion|mobility|movement|tenderness)\b',
-            r'\b(follow-up|appointment|examination|check-up)\b',
-        ]
-        
-        keywords = set()
-        transcript_lower = transcript.lower()
-        
-        for pattern in medical_patterns:
-            matches = re.findall(pattern, transcript_lower, re.IGNORECASE)
-            keywords.update(matches)
+        keywords = set(self.extract_pattern_keywords(transcript))
         
         # Also extract multi-word medical phrases using Gemini
-        keyword_prompt = f"""Extract the {top_n} most important medical keywords or phrases from this medical transcript. 
+        keyword_prompt = self.client.get_transcript_context(transcript) + f"""Extract the {top_n} most important medical keywords or phrases from the medical transcript above. 
         Focus on medical terms, symptoms, treatments, and clinical findings.
 
-        Transcript:
-        {transcript}
-
         Return a JSON array of strings:
         ["keyword1", "keyword2", ...]"""
         
@@ -3,44 +3,94 @@ Main Pipeline Orchestrator
 Combines all modules for end-to-end medical transcript processing
 """
 
-from typing import Dict, Any, Optional
-from .gemini_client import GeminiClient
+import io
+import os
+import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Any, Optional, TextIO
+from .gemini_client import GeminiClient, default_gemini_client
 from .medical_ner import MedicalNER
 from .summarization import MedicalSummarizer
 from .sentiment_analysis import SentimentAnalyzer
 from .soap_generator import SOAPGenerator
+from .semantic_cache import SemanticCache
 
 
 class PhysicianNotetakerPipeline:
     """Main pipeline for processing medical transcripts"""
     
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, use_semantic_cache: bool = False):
         """
         Initialize the complete pipeline
         
         Args:
-            api_key: Gemini API key. If None, reads from environment variable.
+            api_key: Gemini API key. If None, uses the shared default client configured from the environment.
+            use_semantic_cache: Whether to reuse summaries and SOAP notes of previously seen
+                transcripts (matched exactly after whitespace/case normalization; persisted under
+                the SEMANTIC_CACHE_DIR env var directory, if set)
         """
-        # Initialize shared Gemini client
-        self.client = GeminiClient(api_key=api_key)
+        # Initialize shared Gemini client (the process-wide default unless a key is given)
+        self.client = GeminiClient(api_key=api_key) if api_key else default_gemini_client()
+        
+        summary_cache = None
+        soap_cache = None
+        if use_semantic_cache:
+            cache_dir = os.getenv("SEMANTIC_CACHE_DIR")
+            # Clinical results are keyed on exact transcripts, so keep full-precision vectors:
+            # with 8-bit scores a different entry can outrank the identical transcript
+            summary_cache = SemanticCache(
+                threshold=0.95,
+                path=os.path.join(cache_dir, "summary") if cache_dir else None,
+                quantize=False
+            )
+            soap_cache = SemanticCache(
+                threshold=0.95,
+                path=os.path.join(cache_dir, "soap") if cache_dir else None,
+                quantize=False
+            )
         
         # Initialize all modules
         self.ner = MedicalNER(gemini_client=self.client)
-        self.summarizer = MedicalSummarizer(gemini_client=self.client)
+        self.summarizer = MedicalSummarizer(gemini_client=self.client, semantic_cache=summary_cache)
         self.sentiment_analyzer = SentimentAnalyzer(gemini_client=self.client)
-        self.soap_generator = SOAPGenerator(gemini_client=self.client)
+        self.soap_generator = SOAPGenerator(gemini_client=self.client, semantic_cache=soap_cache)
+        
+        # Shared executor for running independent stages concurrently. Stages keep their
+        # own executors: a stage fanning out onto this pool could deadlock waiting on itself
+        self.executor = ThreadPoolExecutor(max_workers=4)
+    
+    def close(self) -> None:
+        """Shut down the stage executor and the executors owned by the NER and sentiment modules"""
+        self.executor.shutdown()
+        self.ner.close()
+        self.sentiment_analyzer.close()
+    
+    def __enter__(self) -> "PhysicianNotetakerPipeline":
+        return self
     
-    def process_transcript(self, transcript: str, include_soap: bool = True) -> Dict[str, Any]:
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+    
+    def process_transcript(
+        self,
+        transcript: str,
+        include_soap: bool = True,
+        combined: bool = False
+    ) -> Dict[str, Any]:
         """
         Process transcript through complete pipeline
         
         Args:
             transcript: Raw physician-patient conversation transcript
             include_soap: Whether to include SOAP note generation (bonus feature)
+            combined: Whether to extract NER, keywords, summary and SOAP note in a single API call
         
         Returns:
             Complete analysis with all extracted information
         """
+        if combined:
+            return self.process_transcript_combined(transcript, include_soap=include_soap)
+        
         results = {
             "Medical_NER": {},
             "Summarization": {},
@@ -48,31 +98,109 @@ class PhysicianNotetakerPipeline:
             "SOAP_Note": {}
         }
         
-        # 1. Medical NER Extraction
+        # Cache the shared transcript prefix server-side for the duration of the run
+        context_cache = self.client.create_transcript_cache(transcript)
+        
+        # Each stage is an independent, I/O-bound Gemini call, so run them concurrently.
+        # The summary only strips fillers when it cannot reuse the cached raw transcript
+        tasks = {
+            "Medical_NER": lambda: self.ner.extract_structured_summary(transcript),
+            "Summarization": lambda: self.summarizer.summarize(
+                transcript, compress=context_cache is None
+            ),
+            "Sentiment_Analysis": lambda: self.sentiment_analyzer.analyze_full_transcript(transcript),
+        }
+        
+        # SOAP Note Generation (Bonus)
+        if include_soap:
+            tasks["SOAP_Note"] = lambda: self.soap_generator.generate_soap_note(transcript)
+        
         try:
-            results["Medical_NER"] = self.ner.extract_structured_summary(transcript)
-        except Exception as e:
-            results["Medical_NER"] = {"error": str(e)}
+            futures = {self.executor.submit(task): name for name, task in tasks.items()}
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    results[name] = future.result()
+                except Exception as e:
+                    results[name] = {"error": str(e)}
+        finally:
+            if context_cache is not None:
+                self.client.delete_transcript_cache(context_cache)
+        
+        return results
+    
+    def process_transcript_combined(self, transcript: str, include_soap: bool = True) -> Dict[str, Any]:
+        """
+        Process transcript using a single combined API call for NER, keywords,
+        summarization and SOAP note, with sentiment analysis run alongside it
+        
+        Args:
+            transcript: Raw physician-patient conversation transcript
+            include_soap: Whether to include SOAP note in the results (bonus feature)
+        
+        Returns:
+            Complete analysis with all extracted information
+        """
+        results = {
+            "Medical_NER": {},
+            "Summarization": {},
+            "Sentiment_Analysis": {},
+            "SOAP_Note": {}
+        }
+        
+        # Sentiment analysis is per patient segment, so run it alongside the combined call
+        sentiment_future = self.executor.submit(
+            self.sentiment_analyzer.analyze_full_transcript, transcript
+        )
         
-        # 2. Text Summarization
         try:
-            results["Summarization"] = self.summarizer.summarize(transcript)
+            prompt = self.client.get_combined_analysis_prompt(transcript, include_soap=include_soap)
+            combined = self.client.generate_json(prompt, temperature=0.2)
         except Exception as e:
+            combined = None
+            results["Medical_NER"] = {"error": str(e)}
             results["Summarization"] = {"error": str(e)}
+            if include_soap:
+                results["SOAP_Note"] = {"error": str(e)}
+        
+        if combined is not None:
+            # 1. Medical NER + Keywords
+            try:
+                ner = combined.get("Medical_NER")
+                entities = self.ner._validate_result(ner if isinstance(ner, dict) else {})
+                keywords = set(self.ner.extract_pattern_keywords(transcript))
+                gemini_keywords = combined.get("Keywords")
+                if isinstance(gemini_keywords, list):
+                    keywords.update([str(kw).strip() for kw in gemini_keywords])
+                results["Medical_NER"] = {**entities, "Keywords": list(keywords)[:10]}
+            except Exception as e:
+                results["Medical_NER"] = {"error": str(e)}
+            
+            # 2. Text Summarization
+            try:
+                summary = combined.get("Summarization")
+                results["Summarization"] = self.summarizer._validate_summary(
+                    summary if isinstance(summary, dict) else {}
+                )
+            except Exception as e:
+                results["Summarization"] = {"error": str(e)}
+            
+            # 4. SOAP Note Generation (Bonus)
+            if include_soap:
+                try:
+                    soap = combined.get("SOAP_Note")
+                    results["SOAP_Note"] = self.soap_generator._validate_soap_result(
+                        soap if isinstance(soap, dict) else {}
+                    )
+                except Exception as e:
+                    results["SOAP_Note"] = {"error": str(e)}
         
         # 3. Sentiment & Intent Analysis
         try:
-            results["Sentiment_Analysis"] = self.sentiment_analyzer.analyze_full_transcript(transcript)
+            results["Sentiment_Analysis"] = sentiment_future.result()
         except Exception as e:
             results["Sentiment_Analysis"] = {"error": str(e)}
         
-        # 4. SOAP Note Generation (Bonus)
-        if include_soap:
-            try:
-                results["SOAP_Note"] = self.soap_generator.generate_soap_note(transcript)
-            except Exception as e:
-                results["SOAP_Note"] = {"error": str(e)}
-        
         return results
     
     def process_quick_summary(self, transcript: str) -> Dict[str, Any]:
@@ -114,55 +242,68 @@ class PhysicianNotetakerPipeline:
             Formatted results string
         """
         if format_type == "json":
-            import json
             return json.dumps(results, indent=2)
         
+        buffer = io.StringIO()
+        self.write_results(results, buffer, format_type=format_type)
+        return buffer.getvalue()
+    
+    def write_results(self, results: Dict[str, Any], fp: TextIO, format_type: str = "json") -> None:
+        """
+        Write results in specified format directly to a file-like object
+        
+        Args:
+            results: Pipeline results dictionary
+            fp: Writable text stream (e.g. an open file or sys.stdout)
+            format_type: "json" or "text"
+        """
+        if format_type == "json":
+            json.dump(results, fp, indent=2)
+        
         elif format_type == "text":
-            text = "=" * 60 + "\n"
-            text += "MEDICAL TRANSCRIPT ANALYSIS RESULTS\n"
-            text += "=" * 60 + "\n\n"
+            write = fp.write
+            write("=" * 60 + "\n")
+            write("MEDICAL TRANSCRIPT ANALYSIS RESULTS\n")
+            write("=" * 60 + "\n\n")
             
             # Medical NER
             if "Medical_NER" in results:
-                text += "MEDICAL ENTITIES:\n"
-                text += "-" * 60 + "\n"
+                write("MEDICAL ENTITIES:\n")
+                write("-" * 60 + "\n")
                 ner = results["Medical_NER"]
                 if "error" not in ner:
-                    text += f"Patient Name: {ner.get('Patient_Name', 'N/A')}\n"
-                    text += f"Symptoms: {', '.join(ner.get('Symptoms', []))}\n"
-                    text += f"Diagnosis: {ner.get('Diagnosis', 'N/A')}\n"
-                    text += f"Treatment: {', '.join(ner.get('Treatment', []))}\n"
-                    text += f"Current Status: {ner.get('Current_Status', 'N/A')}\n"
-                    text += f"Prognosis: {ner.get('Prognosis', 'N/A')}\n"
+                    write(f"Patient Name: {ner.get('Patient_Name', 'N/A')}\n")
+                    write(f"Symptoms: {', '.join(ner.get('Symptoms', []))}\n")
+                    write(f"Diagnosis: {ner.get('Diagnosis', 'N/A')}\n")
+                    write(f"Treatment: {', '.join(ner.get('Treatment', []))}\n")
+                    write(f"Current Status: {ner.get('Current_Status', 'N/A')}\n")
+                    write(f"Prognosis: {ner.get('Prognosis', 'N/A')}\n")
                 else:
-                    text += f"Error: {ner['error']}\n"
-                text += "\n"
+                    write(f"Error: {ner['error']}\n")
+                write("\n")
             
             # Sentiment Analysis
             if "Sentiment_Analysis" in results:
-                text += "SENTIMENT ANALYSIS:\n"
-                text += "-" * 60 + "\n"
+                write("SENTIMENT ANALYSIS:\n")
+                write("-" * 60 + "\n")
                 sentiment = results["Sentiment_Analysis"]
                 if "error" not in sentiment:
-                    text += f"Overall Sentiment: {sentiment.get('Overall_Sentiment', 'N/A')}\n"
-                    text += f"Overall Intent: {sentiment.get('Overall_Intent', 'N/A')}\n"
-                    text += f"Segments Analyzed: {sentiment.get('Segments_Analyzed', 0)}\n"
+                    write(f"Overall Sentiment: {sentiment.get('Overall_Sentiment', 'N/A')}\n")
+                    write(f"Overall Intent: {sentiment.get('Overall_Intent', 'N/A')}\n")
+                    write(f"Segments Analyzed: {sentiment.get('Segments_Analyzed', 0)}\n")
                 else:
-                    text += f"Error: {sentiment['error']}\n"
-                text += "\n"
+                    write(f"Error: {sentiment['error']}\n")
+                write("\n")
             
             # SOAP Note
             if "SOAP_Note" in results:
-                text += "SOAP NOTE:\n"
-                text += "-" * 60 + "\n"
+                write("SOAP NOTE:\n")
+                write("-" * 60 + "\n")
                 soap = results["SOAP_Note"]
                 if "error" not in soap:
-                    text += self.soap_generator.format_soap_note(soap, format_type="text")
+                    write(self.soap_generator.format_soap_note(soap, format_type="text"))
                 else:
-                    text += f"Error: {soap['error']}\n"
-            
-            return text
+                    write(f"Error: {soap['error']}\n")
         
         else:
             raise ValueError(f"Unknown format type: {format_type}")
-
@@ -0,0 +1,108 @@
+"""
+Exact-Match Response Cache for Gemini API Calls
+In-memory LRU with optional SQLite persistence across runs
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+
+class ResponseCache:
+    """
+    Thread-safe LRU cache for model responses, optionally backed by SQLite
+    
+    Entries are held JSON-encoded, so every get() returns a fresh copy that callers
+    may mutate without corrupting later hits
+    """
+    
+    def __init__(
+        self,
+        max_size: int = 256,
+        path: Optional[str] = None,
+        ttl: Optional[float] = 86400
+    ):
+        """
+        Initialize response cache
+        
+        Args:
+            max_size: Maximum number of entries kept in memory
+            path: SQLite database file for persistence. If None, cache is memory-only
+            ttl: Time-to-live for persisted entries in seconds. If None, entries never expire
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL)"
+            )
+            self._db.commit()
+    
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Look up a cached response
+        
+        Args:
+            key: Cache key
+        
+        Returns:
+            Cached value, or None on miss
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return json.loads(self._entries[key])
+            
+            if self._db is None:
+                return None
+            
+            row = self._db.execute(
+                "SELECT value, expires FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            
+            value, expires = row
+            if expires is not None and expires < time.time():
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._db.commit()
+                return None
+            
+            self._remember(key, value)
+            return json.loads(value)
+    
+    def set(self, key: str, value: Any) -> None:
+        """
+        Store a response
+        
+        Args:
+            key: Cache key
+            value: JSON-serializable response (text or parsed JSON)
+        """
+        encoded = json.dumps(value)
+        with self._lock:
+            self._remember(key, encoded)
+            
+            if self._db is not None:
+                expires = time.time() + self.ttl if self.ttl is not None else None
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, expires) VALUES (?, ?, ?)",
+                    (key, encoded, expires)
+                )
+                self._db.commit()
+    
+    def _remember(self, key: str, encoded: str) -> None:
+        """Insert a JSON-encoded value into the in-memory LRU, evicting the oldest entry if full"""
+        self._entries[key] = encoded
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
@@ -0,0 +1,249 @@
+"""
+Semantic Response Cache
+Returns cached results for near-duplicate inputs using embedding similarity
+"""
+
+import atexit
+import base64
+import json
+import os
+import threading
+from functools import lru_cache
+from typing import IO, Any, Callable, Optional
+
+try:
+    import numpy as np
+    from sentence_transformers import SentenceTransformer
+except ImportError:  # Optional dependency
+    np = None
+    SentenceTransformer = None
+
+try:
+    import faiss
+except ImportError:  # Optional dependency, falls back to a numpy scan
+    faiss = None
+
+from .cache_store import CacheLog
+
+
+DEFAULT_EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+# Words per embedded window. all-MiniLM-L6-v2 silently truncates input at 256 word
+# pieces, so longer texts are embedded window by window and mean-pooled; 128 words
+# leaves headroom for clinical terms that split into several word pieces
+EMBEDDING_WINDOW_WORDS = 128
+
+_model_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def _load_model(model_name: str):
+    """Load an embedding model once per process, shared by all caches"""
+    return SentenceTransformer(model_name)
+
+
+def _replace_file(path: str, write: Callable[[IO], None], binary: bool = False) -> None:
+    """Write a file through a temporary sibling and atomically swap it into place"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb" if binary else "w", encoding=None if binary else "utf-8") as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class SemanticCache:
+    """Embedding-based cache that matches inputs by cosine similarity"""
+    
+    def __init__(
+        self,
+        threshold: float = 0.92,
+        model_name: str = DEFAULT_EMBEDDING_MODEL,
+        path: Optional[str] = None,
+        quantize: bool = True
+    ):
+        """
+        Initialize semantic cache
+        
+        Args:
+            threshold: Minimum cosine similarity for a cache hit
+            model_name: Sentence-transformers model used to embed inputs
+            path: Directory for persisting the cache. If None, cache is memory-only.
+                New entries are appended to a log by a background thread; the log is
+                compacted into a snapshot on load and at interpreter exit (or via save())
+            quantize: Store vectors in the faiss index as 8-bit scalars (4x smaller scans);
+                ignored when faiss is not installed
+        """
+        self.threshold = threshold
+        self.model_name = model_name
+        self.path = path
+        self.quantize = quantize
+        self._index = None
+        self._vectors = None
+        self._values = []
+        self._lock = threading.Lock()
+        self._embed_cached = lru_cache(maxsize=256)(self._encode)
+        self._log = None
+        self._unsaved = 0
+        
+        if self.available and path:
+            self._log = CacheLog(os.path.join(path, "entries.log"))
+            self._load()
+            atexit.register(self.save)
+    
+    @property
+    def available(self) -> bool:
+        """Whether the optional embedding dependencies are installed"""
+        return SentenceTransformer is not None
+    
+    def _encode(self, text: str):
+        """Embed the full text into a normalized vector (mean of per-window embeddings)"""
+        words = text.split()
+        windows = [
+            " ".join(words[start:start + EMBEDDING_WINDOW_WORDS])
+            for start in range(0, len(words), EMBEDDING_WINDOW_WORDS)
+        ] or [text]
+        
+        with _model_lock:
+            model = _load_model(self.model_name)
+        vectors = np.asarray(model.encode(windows, normalize_embeddings=True), dtype=np.float32)
+        vector = vectors.mean(axis=0, keepdims=True)
+        
+        # Re-normalize so inner product stays cosine similarity
+        norm = float(np.linalg.norm(vector))
+        if norm > 0:
+            vector /= norm
+        return vector
+    
+    def _new_index(self, dim: int):
+        """Create the faiss inner-product index for vectors of the given dimension"""
+        if not self.quantize:
+            return faiss.IndexFlatIP(dim)
+        index = faiss.IndexScalarQuantizer(
+            dim, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT
+        )
+        # Normalized embeddings lie in [-1, 1] per dimension, so train on those bounds
+        # directly instead of waiting for sample data
+        bounds = np.ones((2, dim), dtype=np.float32)
+        bounds[0] = -1.0
+        index.train(bounds)
+        return index
+    
+    def _add_vector(self, vector) -> None:
+        """Append a normalized vector to the similarity index"""
+        if faiss is not None:
+            if self._index is None:
+                self._index = self._new_index(vector.shape[1])
+            self._index.add(vector)
+        elif self._vectors is None:
+            self._vectors = vector
+        else:
+            self._vectors = np.vstack([self._vectors, vector])
+    
+    def _search(self, vector):
+        """Return (similarity, id) of the nearest cached entry, or None if empty"""
+        if not self._values:
+            return None
+        if faiss is not None:
+            scores, ids = self._index.search(vector, 1)
+            return float(scores[0][0]), int(ids[0][0])
+        scores = self._vectors @ vector[0]
+        best = int(np.argmax(scores))
+        return float(scores[best]), best
+    
+    def get(self, text: str, threshold: Optional[float] = None) -> Optional[Any]:
+        """
+        Look up the cached result for a semantically similar input
+        
+        Args:
+            text: Input text
+            threshold: Override for the minimum cosine similarity
+        
+        Returns:
+            Cached value, or None on miss or if dependencies are unavailable
+        """
+        if not self.available:
+            return None
+        
+        vector = self._embed_cached(text)
+        with self._lock:
+            match = self._search(vector)
+            if match is None:
+                return None
+            score, idx = match
+            if score >= (self.threshold if threshold is None else threshold):
+                return self._values[idx]
+        return None
+    
+    def set(self, text: str, value: Any) -> None:
+        """
+        Store the result for an input
+        
+        Args:
+            text: Input text
+            value: JSON-serializable result
+        """
+        if not self.available:
+            return
+        
+        vector = self._embed_cached(text)
+        with self._lock:
+            if self._log is not None:
+                encoded = base64.b64encode(vector.tobytes()).decode("ascii")
+                self._log.append({"index": len(self._values), "vector": encoded, "value": value})
+            self._add_vector(vector)
+            self._values.append(value)
+            self._unsaved += 1
+    
+    def save(self) -> None:
+        """Compact the entry log into a snapshot of cached vectors and values (no-op if nothing is new)"""
+        if self._log is None:
+            return
+        
+        with self._lock:
+            if not self._unsaved:
+                return
+            if faiss is not None:
+                vectors = self._index.reconstruct_n(0, self._index.ntotal)
+            else:
+                vectors = self._vectors
+            os.makedirs(self.path, exist_ok=True)
+            # Each file is replaced atomically; vectors go first so a crash in between
+            # leaves extra vector rows (trimmed on load), never values without vectors
+            _replace_file(
+                os.path.join(self.path, "vectors.npy"), lambda f: np.save(f, vectors), binary=True
+            )
+            _replace_file(
+                os.path.join(self.path, "values.json"), lambda f: json.dump(self._values, f)
+            )
+            # Entries added under the lock are all in the snapshot, so the log can be dropped
+            self._log.truncate()
+            self._unsaved = 0
+    
+    def _load(self) -> None:
+        """Load the persisted snapshot, then replay and compact entries logged since it was written"""
+        if os.path.exists(os.path.join(self.path, "values.json")):
+            try:
+                vectors = np.load(os.path.join(self.path, "vectors.npy")).astype(np.float32)
+                with open(os.path.join(self.path, "values.json"), "r", encoding="utf-8") as f:
+                    values = json.load(f)
+            except (OSError, ValueError, EOFError):
+                # An unreadable snapshot only costs cache hits; rebuild from the log
+                vectors, values = None, []
+            
+            # Entries are append-only, so rows shared by both files belong together
+            count = min(len(vectors), len(values)) if vectors is not None else 0
+            if count:
+                self._add_vector(vectors[:count])
+                self._values = values[:count]
+        
+        for record in self._log.replay():
+            # Skip entries already compacted into the snapshot (crash before truncation)
+            if record.get("index", len(self._values)) < len(self._values):
+                continue
+            vector = np.frombuffer(base64.b64decode(record["vector"]), dtype=np.float32)
+            self._add_vector(vector.reshape(1, -1))
+            self._values.append(record["value"])
+            self._unsaved += 1
+        
+        self.save()
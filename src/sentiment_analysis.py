@@ -3,22 +3,52 @@ Sentiment and Intent Analysis Module
 Analyzes patient sentiment and intent from medical dialogue
 """
 
-import re
+import os
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any, List, Optional
-from .gemini_client import GeminiClient
+from .gemini_client import GeminiClient, default_gemini_client
+from .semantic_cache import SemanticCache
+from .utils import OTHER_SPEAKER_PREFIXES, PATIENT_PREFIXES
 
 
 class SentimentAnalyzer:
     """Sentiment and intent analysis for patient dialogue"""
     
-    def __init__(self, gemini_client: Optional[GeminiClient] = None):
+    def __init__(
+        self,
+        gemini_client: Optional[GeminiClient] = None,
+        semantic_cache: Optional[SemanticCache] = None
+    ):
         """
         Initialize Sentiment Analyzer
         
         Args:
-            gemini_client: GeminiClient instance. If None, creates a new one.
+            gemini_client: GeminiClient instance. If None, uses the shared default client.
+            semantic_cache: Cache for near-duplicate patient statements. If None, creates
+                one persisted under the SEMANTIC_CACHE_DIR env var directory (if set).
         """
-        self.client = gemini_client or GeminiClient()
+        self.client = gemini_client or default_gemini_client()
+        if semantic_cache is None:
+            cache_dir = os.getenv("SEMANTIC_CACHE_DIR")
+            semantic_cache = SemanticCache(
+                threshold=0.92,
+                path=os.path.join(cache_dir, "sentiment") if cache_dir else None
+            )
+        self.semantic_cache = semantic_cache
+        
+        # Executor for analyzing patient segments concurrently
+        self.executor = ThreadPoolExecutor(max_workers=8)
+    
+    def close(self) -> None:
+        """Shut down the segment executor, waiting for running analyses to finish"""
+        self.executor.shutdown()
+    
+    def __enter__(self) -> "SentimentAnalyzer":
+        return self
+    
+    def __exit__(self, *exc_info) -> None:
+        self.close()
     
     def analyze_sentiment(self, patient_text: str) -> Dict[str, str]:
         """
@@ -30,10 +60,24 @@ class SentimentAnalyzer:
         Returns:
             Dictionary with Sentiment and Intent classifications
         """
+        # Paraphrased statements resolve to the same classification without an API call
+        cached = self.semantic_cache.get(patient_text)
+        if cached is not None:
+            return dict(cached)
+        
         prompt = self.client.get_sentiment_prompt(patient_text)
         result = self.client.generate_json(prompt, temperature=0.2)
         
-        return self._validate_sentiment_result(result)
+        validated = self._validate_sentiment_result(result)
+        self.semantic_cache.set(patient_text, validated)
+        return validated
+    
+    def _analyze_segment_safe(self, patient_text: str) -> Dict[str, str]:
+        """Analyze a single segment, falling back to defaults if the call fails"""
+        try:
+            return self.analyze_sentiment(patient_text)
+        except Exception:
+            return {"Sentiment": "Neutral", "Intent": "Other"}
     
     def _validate_sentiment_result(self, result: Dict[str, Any]) -> Dict[str, str]:
         """Validate sentiment analysis result"""
@@ -82,28 +126,29 @@ class SentimentAnalyzer:
             List of patient dialogue segments
         """
         patient_segments = []
-        
-        # Pattern to match patient statements
-        patterns = [
-            r'Patient[:\s]+["\']?([^"]+)["\']?',
-            r'Patient:\s*(.+?)(?=\n(?:Physician|Doctor|\[))',
-            r'\*\*Patient:\*\*\s*(.+?)(?=\n\*\*Physician|\n\*\*Doctor|\Z)',
-        ]
-        
-        for pattern in patterns:
-            matches = re.findall(pattern, transcript, re.IGNORECASE | re.DOTALL)
-            patient_segments.extend([match.strip() for match in matches if match.strip()])
-        
-        # If no pattern matches, try line-by-line extraction
-        if not patient_segments:
-            lines = transcript.split('\n')
-            for line in lines:
-                line_lower = line.lower()
-                if 'patient:' in line_lower or 'patient ' in line_lower:
-                    # Extract text after "Patient:"
-                    parts = re.split(r'patient[:\s]+', line, flags=re.IGNORECASE)
-                    if len(parts) > 1:
-                        patient_segments.append(parts[1].strip())
+        current = None  # Lines of the patient turn being collected, None outside patient turns
+        
+        # Single pass over lines, tracking which speaker's turn we are in
+        for line in transcript.split('\n'):
+            text = line.strip().lstrip('*').strip()
+            text_lower = text.lower()
+            
+            if text_lower.startswith(PATIENT_PREFIXES):
+                if current:
+                    patient_segments.append(' '.join(current))
+                # Drop the speaker label along with any markdown or quotes around it
+                content = text[len('patient'):].lstrip(':*"\' \t').rstrip('"\'')
+                current = [content] if content else []
+            elif text_lower.startswith(OTHER_SPEAKER_PREFIXES):
+                if current:
+                    patient_segments.append(' '.join(current))
+                current = None
+            elif current is not None and text:
+                # Continuation of a multi-line patient turn
+                current.append(text)
+        
+        if current:
+            patient_segments.append(' '.join(current))
         
         return patient_segments
     
@@ -134,20 +179,22 @@ class SentimentAnalyzer:
         sentiments = []
         intents = []
         
-        for segment in patient_segments:
-            if len(segment) > 10:  # Only analyze substantial segments
-                analysis = self.analyze_sentiment(segment)
-                segment_analyses.append({
-                    "Text": segment[:100] + "..." if len(segment) > 100 else segment,
-                    "Sentiment": analysis["Sentiment"],
-                    "Intent": analysis["Intent"]
-                })
-                sentiments.append(analysis["Sentiment"])
-                intents.append(analysis["Intent"])
+        # Only analyze substantial segments
+        segments = [segment for segment in patient_segments if len(segment) > 10]
+        analyses = list(self.executor.map(self._analyze_segment_safe, segments, chunksize=1))
+        
+        for segment, analysis in zip(segments, analyses):
+            segment_analyses.append({
+                "Text": segment[:100] + "..." if len(segment) > 100 else segment,
+                "Sentiment": analysis["Sentiment"],
+                "Intent": analysis["Intent"]
+            })
+            sentiments.append(analysis["Sentiment"])
+            intents.append(analysis["Intent"])
         
         # Determine overall sentiment (most common)
-        overall_sentiment = max(set(sentiments), key=sentiments.count) if sentiments else "Neutral"
-        overall_intent = max(set(intents), key=intents.count) if intents else "Other"
+        overall_sentiment = Counter(sentiments).most_common(1)[0][0] if sentiments else "Neutral"
+        overall_intent = Counter(intents).most_common(1)[0][0] if intents else "Other"
         
         return {
             "Overall_Sentiment": overall_sentiment,
@@ -3,21 +3,154 @@ SOAP Note Generation Module
 Converts medical transcripts into structured SOAP notes
 """
 
-from typing import Dict, Any, Optional
-from .gemini_client import GeminiClient
+from __future__ import annotations
 
+import json
+from typing import Dict, Any, Callable, Iterator, List, Tuple, Union
+from .cached_generator import CachedGenerator
 
-class SOAPGenerator:
+try:
+    import orjson
+except ImportError:  # Optional dependency, falls back to the stdlib encoder
+    orjson = None
+
+# Shared read-only stand-in for missing or malformed sections
+_EMPTY: Dict[str, Any] = {}
+
+# Sampling temperature for every SOAP generation path (low for deterministic JSON);
+# the matching generation config is built once and reused by GeminiClient
+SOAP_TEMPERATURE = 0.2
+
+# SOAP note structure: (section, fields) in output order
+SOAP_SCHEMA: Tuple[Tuple[str, Tuple[str, ...]], ...] = (
+    ("Subjective", ("Chief_Complaint", "History_of_Present_Illness")),
+    ("Objective", ("Physical_Exam", "Observations")),
+    ("Assessment", ("Diagnosis", "Severity")),
+    ("Plan", ("Treatment", "Follow-Up")),
+)
+
+
+# Display templates for format_soap_note, rendered in a single pass
+_TEXT_TEMPLATE = (
+    "SOAP NOTE\n"
+    + "=" * 50 + "\n\n"
+    "SUBJECTIVE:\n"
+    "  Chief Complaint: {s_cc}\n"
+    "  History of Present Illness: {s_hpi}\n\n"
+    "OBJECTIVE:\n"
+    "  Physical Exam: {o_pe}\n"
+    "  Observations: {o_obs}\n\n"
+    "ASSESSMENT:\n"
+    "  Diagnosis: {a_dx}\n"
+    "  Severity: {a_sev}\n\n"
+    "PLAN:\n"
+    "  Treatment: {p_tx}\n"
+    "  Follow-Up: {p_fu}\n"
+)
+
+_MD_TEMPLATE = (
+    "# SOAP Note\n\n"
+    "## Subjective\n\n"
+    "**Chief Complaint:** {s_cc}\n\n"
+    "**History of Present Illness:** {s_hpi}\n\n"
+    "## Objective\n\n"
+    "**Physical Exam:** {o_pe}\n\n"
+    "**Observations:** {o_obs}\n\n"
+    "## Assessment\n\n"
+    "**Diagnosis:** {a_dx}\n\n"
+    "**Severity:** {a_sev}\n\n"
+    "## Plan\n\n"
+    "**Treatment:** {p_tx}\n\n"
+    "**Follow-Up:** {p_fu}\n"
+)
+
+
+def _template_fields(soap_note: Dict[str, Any]) -> Dict[str, Any]:
+    """Flatten a SOAP note into the placeholder values used by the display templates"""
+    subjective = soap_note['Subjective']
+    objective = soap_note['Objective']
+    assessment = soap_note['Assessment']
+    plan = soap_note['Plan']
+    return {
+        "s_cc": subjective['Chief_Complaint'],
+        "s_hpi": subjective['History_of_Present_Illness'],
+        "o_pe": objective['Physical_Exam'],
+        "o_obs": objective['Observations'],
+        "a_dx": assessment['Diagnosis'],
+        "a_sev": assessment['Severity'],
+        "p_tx": plan['Treatment'],
+        "p_fu": plan['Follow-Up'],
+    }
+
+
+def _fmt_json(soap_note: Dict[str, Any]) -> str:
+    """Render a SOAP note as indented JSON"""
+    if orjson is not None:
+        return orjson.dumps(soap_note, option=orjson.OPT_INDENT_2).decode()
+    return json.dumps(soap_note, indent=2, ensure_ascii=False)
+
+
+def _fmt_dict(soap_note: Dict[str, Any]) -> Dict[str, Any]:
+    """Return the SOAP note unchanged, for callers that serialize it themselves"""
+    return soap_note
+
+
+def _fmt_text(soap_note: Dict[str, Any]) -> str:
+    """Render a SOAP note as plain text"""
+    return _TEXT_TEMPLATE.format_map(_template_fields(soap_note))
+
+
+def _fmt_md(soap_note: Dict[str, Any]) -> str:
+    """Render a SOAP note as Markdown"""
+    return _MD_TEMPLATE.format_map(_template_fields(soap_note))
+
+
+# format_type -> formatter used by format_soap_note
+_FORMATTERS: Dict[str, Callable[[Dict[str, Any]], Union[str, Dict[str, Any]]]] = {
+    "dict": _fmt_dict,
+    "json": _fmt_json,
+    "text": _fmt_text,
+    "markdown": _fmt_md,
+}
+
+
+def _compile_validator(
+    schema: Tuple[Tuple[str, Tuple[str, ...]], ...],
+    default: str
+) -> Callable[[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Generate a straight-line validator for a two-level section/field schema
+    
+    Args:
+        schema: (section, fields) pairs describing the expected structure
+        default: Value used for missing fields and sections
+    
+    Returns:
+        Function mapping a raw model result to a fully populated dictionary
+    """
+    lines = ["def _validate(result):"]
+    sections = []
+    for i, (section, fields) in enumerate(schema):
+        lines.append(f"    s{i} = result.get({section!r})")
+        lines.append(f"    s{i} = s{i} if type(s{i}) is dict else _EMPTY")
+        entries = ", ".join(f"{field!r}: s{i}.get({field!r}, _DEFAULT)" for field in fields)
+        sections.append(f"{section!r}: {{{entries}}}")
+    lines.append(f"    return {{{', '.join(sections)}}}")
+    
+    namespace = {"_EMPTY": _EMPTY, "_DEFAULT": default}
+    exec("\n".join(lines), namespace)
+    validator = namespace["_validate"]
+    validator.__doc__ = "Validate and structure a result against the compiled schema"
+    return validator
+
+
+class SOAPGenerator(CachedGenerator):
     """SOAP note generation from medical transcripts"""
     
-    def __init__(self, gemini_client: Optional[GeminiClient] = None):
-        """
-        Initialize SOAP Generator
-        
-        Args:
-            gemini_client: GeminiClient instance. If None, creates a new one.
-        """
-        self.client = gemini_client or GeminiClient()
+    __slots__ = ()
+    
+    # Validate and structure SOAP note result (generated once at import from SOAP_SCHEMA)
+    _validate_soap_result = staticmethod(_compile_validator(SOAP_SCHEMA, "Not documented"))
     
     def generate_soap_note(self, transcript: str) -> Dict[str, Any]:
         """
@@ -29,87 +162,115 @@ class SOAPGenerator:
         Returns:
             Structured SOAP note in JSON format
         """
+        return self._generate_cached(
+            transcript,
+            self.client.get_soap_prompt(transcript),
+            SOAP_TEMPERATURE,
+            self._validate_soap_result
+        )
+    
+    def generate_soap_note_stream(self, transcript: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Generate SOAP note from transcript, yielding each section as soon as it is generated
+        
+        Args:
+            transcript: Raw physician-patient conversation transcript
+        
+        Yields:
+            (section, validated section) pairs, e.g. ("Subjective", {...}); sections the
+            model did not produce are yielded with defaults once the response ends
+        """
+        remaining = [section for section, _ in SOAP_SCHEMA]
         prompt = self.client.get_soap_prompt(transcript)
-        result = self.client.generate_json(prompt, temperature=0.2)
         
-        return self._validate_soap_result(result)
+        for section, value in self.client.stream_json(prompt, temperature=SOAP_TEMPERATURE):
+            if section in remaining:
+                remaining.remove(section)
+                yield section, self._validate_soap_result({section: value})[section]
+        
+        defaults = self._validate_soap_result({})
+        for section in remaining:
+            yield section, defaults[section]
     
-    def _validate_soap_result(self, result: Dict[str, Any]) -> Dict[str, Any]:
-        """Validate and structure SOAP note result"""
-        validated = {
-            "Subjective": {
-                "Chief_Complaint": result.get("Subjective", {}).get("Chief_Complaint", "Not documented") if isinstance(result.get("Subjective"), dict) else "Not documented",
-                "History_of_Present_Illness": result.get("Subjective", {}).get("History_of_Present_Illness", "Not documented") if isinstance(result.get("Subjective"), dict) else "Not documented"
-            },
-            "Objective": {
-                "Physical_Exam": result.get("Objective", {}).get("Physical_Exam", "Not documented") if isinstance(result.get("Objective"), dict) else "Not documented",
-                "Observations": result.get("Objective", {}).get("Observations", "Not documented") if isinstance(result.get("Objective"), dict) else "Not documented"
-            },
-            "Assessment": {
-                "Diagnosis": result.get("Assessment", {}).get("Diagnosis", "Not documented") if isinstance(result.get("Assessment"), dict) else "Not documented",
-                "Severity": result.get("Assessment", {}).get("Severity", "Not documented") if isinstance(result.get("Assessment"), dict) else "Not documented"
-            },
-            "Plan": {
-                "Treatment": result.get("Plan", {}).get("Treatment", "Not documented") if isinstance(result.get("Plan"), dict) else "Not documented",
-                "Follow-Up": result.get("Plan", {}).get("Follow-Up", "Not documented") if isinstance(result.get("Plan"), dict) else "Not documented"
-            }
-        }
-        return validated
+    async def agenerate_soap_note(self, transcript: str) -> Dict[str, Any]:
+        """
+        Async variant of generate_soap_note; use with asyncio.gather to process many transcripts concurrently
+        
+        Args:
+            transcript: Raw physician-patient conversation transcript
+        
+        Returns:
+            Structured SOAP note in JSON format
+        """
+        return await self._agenerate_cached(
+            transcript,
+            self.client.get_soap_prompt(transcript),
+            SOAP_TEMPERATURE,
+            self._validate_soap_result
+        )
     
-    def format_soap_note(self, soap_note: Dict[str, Any], format_type: str = "json") -> str:
+    def generate_soap_notes_batch(self, transcripts: List[str], batch_size: int = 8) -> List[Dict[str, Any]]:
         """
-        Format SOAP note for display
+        Generate SOAP notes for several transcripts, several per API call
         
         Args:
-            soap_note: SOAP note dictionary
-            format_type: "json", "text", or "markdown"
+            transcripts: Raw physician-patient conversation transcripts
+            batch_size: Maximum number of transcripts sent in a single call
         
         Returns:
-            Formatted SOAP note string
+            Structured SOAP notes, in the same order as the transcripts
         """
-        if format_type == "json":
-            import json
-            return json.dumps(soap_note, indent=2)
+        notes = [None] * len(transcripts)
         
-        elif format_type == "text":
-            text = "SOAP NOTE\n"
-            text += "=" * 50 + "\n\n"
-            
-            text += "SUBJECTIVE:\n"
-            text += f"  Chief Complaint: {soap_note['Subjective']['Chief_Complaint']}\n"
-            text += f"  History of Present Illness: {soap_note['Subjective']['History_of_Present_Illness']}\n\n"
-            
-            text += "OBJECTIVE:\n"
-            text += f"  Physical Exam: {soap_note['Objective']['Physical_Exam']}\n"
-            text += f"  Observations: {soap_note['Objective']['Observations']}\n\n"
-            
-            text += "ASSESSMENT:\n"
-            text += f"  Diagnosis: {soap_note['Assessment']['Diagnosis']}\n"
-            text += f"  Severity: {soap_note['Assessment']['Severity']}\n\n"
+        # Serve near-duplicates from the semantic cache, as generate_soap_note does
+        pending = []
+        for position, transcript in enumerate(transcripts):
+            cache_text, cached = self._lookup_cache(transcript)
+            if cached is not None:
+                notes[position] = cached
+            else:
+                pending.append((position, cache_text, transcript))
+        
+        for start in range(0, len(pending), batch_size):
+            batch = pending[start:start + batch_size]
+            prompt = self.client.get_soap_batch_prompt([transcript for _, _, transcript in batch])
             
-            text += "PLAN:\n"
-            text += f"  Treatment: {soap_note['Plan']['Treatment']}\n"
-            text += f"  Follow-Up: {soap_note['Plan']['Follow-Up']}\n"
+            try:
+                result = self.client.generate_json(prompt, temperature=SOAP_TEMPERATURE)
+                batch_notes = result.get("notes") if isinstance(result, dict) else None
+            except Exception:
+                batch_notes = None
             
-            return text
+            if isinstance(batch_notes, list) and len(batch_notes) == len(batch):
+                for (position, cache_text, _), note in zip(batch, batch_notes):
+                    notes[position] = self._store_result(
+                        cache_text, self._validate_soap_result(note if isinstance(note, dict) else _EMPTY)
+                    )
+            else:
+                # Batch response was unusable; fall back to one call per transcript
+                for position, _, transcript in batch:
+                    notes[position] = self.generate_soap_note(transcript)
         
-        elif format_type == "markdown":
-            md = "# SOAP Note\n\n"
-            md += "## Subjective\n\n"
-            md += f"**Chief Complaint:** {soap_note['Subjective']['Chief_Complaint']}\n\n"
-            md += f"**History of Present Illness:** {soap_note['Subjective']['History_of_Present_Illness']}\n\n"
-            md += "## Objective\n\n"
-            md += f"**Physical Exam:** {soap_note['Objective']['Physical_Exam']}\n\n"
-            md += f"**Observations:** {soap_note['Objective']['Observations']}\n\n"
-            md += "## Assessment\n\n"
-            md += f"**Diagnosis:** {soap_note['Assessment']['Diagnosis']}\n\n"
-            md += f"**Severity:** {soap_note['Assessment']['Severity']}\n\n"
-            md += "## Plan\n\n"
-            md += f"**Treatment:** {soap_note['Plan']['Treatment']}\n\n"
-            md += f"**Follow-Up:** {soap_note['Plan']['Follow-Up']}\n"
-            
-            return md
+        return notes
+    
+    def format_soap_note(
+        self,
+        soap_note: Dict[str, Any],
+        format_type: str = "json"
+    ) -> Union[str, Dict[str, Any]]:
+        """
+        Format SOAP note for display
         
-        else:
-            raise ValueError(f"Unknown format type: {format_type}")
-
+        Args:
+            soap_note: SOAP note dictionary
+            format_type: "json", "text", "markdown", or "dict" (returns the note unchanged,
+                skipping encoding for callers such as web frameworks that serialize it themselves)
+        
+        Returns:
+            Formatted SOAP note string, or the SOAP note dictionary for "dict"
+        """
+        try:
+            formatter = _FORMATTERS[format_type]
+        except KeyError:
+            raise ValueError(f"Unknown format type: {format_type}") from None
+        return formatter(soap_note)
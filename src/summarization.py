@@ -3,91 +3,127 @@ Medical Text Summarization Module
 Converts transcripts into structured medical reports
 """
 
-from typing import Dict, Any, Optional
-from .gemini_client import GeminiClient
+from __future__ import annotations
 
+from typing import Dict, Any
+from .cached_generator import CachedGenerator
+from .utils import compress_transcript, ensure_list
 
-class MedicalSummarizer:
-    """Medical text summarization using Gemini API"""
-    
-    def __init__(self, gemini_client: Optional[GeminiClient] = None):
-        """
-        Initialize Medical Summarizer
-        
-        Args:
-            gemini_client: GeminiClient instance. If None, creates a new one.
-        """
-        self.client = gemini_client or GeminiClient()
-    
-    def summarize(self, transcript: str) -> Dict[str, Any]:
-        """
-        Summarize medical transcript into structured report
-        
-        Args:
-            transcript: Raw physician-patient conversation transcript
-        
-        Returns:
-            Structured medical summary in JSON format
-        """
-        prompt = self.client.get_summarization_prompt(transcript)
-        
-        # Request structured summary
-        enhanced_prompt = f"""{prompt}
+# Sampling temperature for structured summaries; the matching generation config is
+# built once and reused by GeminiClient
+SUMMARY_TEMPERATURE = 0.3
+
+# Structured summary schema appended to the summarization instructions
+SUMMARY_SCHEMA_INSTRUCTIONS = """
 
 Return a JSON object with this structure:
-{{
-  "Patient_Demographics": {{
+{
+  "Patient_Demographics": {
     "Name": "string or null",
     "Age": "string or null",
     "Gender": "string or null"
-  }},
+  },
   "Chief_Complaint": "string",
   "History_of_Present_Illness": "string",
-  "Symptoms": {{
+  "Symptoms": {
     "Primary": ["symptom1", "symptom2"],
     "Secondary": ["symptom1", "symptom2"],
     "Timeline": "string description"
-  }},
+  },
   "Previous_Treatments": ["treatment1", "treatment2"],
   "Current_Status": "string",
   "Medical_Findings": "string",
   "Clinical_Notes": "string"
-}}"""
+}"""
+
+
+# Shared read-only stand-in for missing or malformed sections
+_EMPTY: Dict[str, Any] = {}
+
+
+class MedicalSummarizer(CachedGenerator):
+    """Medical text summarization using Gemini API"""
+    
+    __slots__ = ()
+    
+    # JSON schema appended to the summarization instructions; override in subclasses
+    # to request a different summary structure
+    schema_instructions = SUMMARY_SCHEMA_INSTRUCTIONS
+    
+    def summarize(self, transcript: str, compress: bool = True) -> Dict[str, Any]:
+        """
+        Summarize medical transcript into structured report
+        
+        Args:
+            transcript: Raw physician-patient conversation transcript
+            compress: Whether to strip verbal fillers before sending. Disable when the raw
+                transcript is held in a server-side context cache, so the prompt reuses it
         
-        result = self.client.generate_json(enhanced_prompt, temperature=0.3)
-        return self._validate_summary(result)
+        Returns:
+            Structured medical summary in JSON format
+        """
+        return self._generate_cached(
+            transcript,
+            self._summary_prompt(transcript, compress),
+            SUMMARY_TEMPERATURE,
+            self._validate_summary
+        )
+    
+    async def asummarize(self, transcript: str, compress: bool = True) -> Dict[str, Any]:
+        """
+        Async variant of summarize; use with asyncio.gather to summarize many transcripts concurrently
+        
+        Args:
+            transcript: Raw physician-patient conversation transcript
+            compress: Whether to strip verbal fillers before sending
+        
+        Returns:
+            Structured medical summary in JSON format
+        """
+        return await self._agenerate_cached(
+            transcript,
+            self._summary_prompt(transcript, compress),
+            SUMMARY_TEMPERATURE,
+            self._validate_summary
+        )
+    
+    def _summary_prompt(self, transcript: str, compress: bool) -> str:
+        """Build the structured summary prompt (instructions plus schema)"""
+        if compress:
+            transcript = compress_transcript(transcript)
+        return self.client.get_summarization_prompt(transcript) + self.schema_instructions
     
     def _validate_summary(self, result: Dict[str, Any]) -> Dict[str, Any]:
         """Validate and structure summary result"""
+        # Look up each nested section once; non-dict sections fall back to defaults
+        demographics = result.get("Patient_Demographics")
+        if not isinstance(demographics, dict):
+            demographics = _EMPTY
+        symptoms = result.get("Symptoms")
+        symptoms_valid = isinstance(symptoms, dict)
+        if not symptoms_valid:
+            symptoms = _EMPTY
+        
         validated = {
             "Patient_Demographics": {
-                "Name": result.get("Patient_Demographics", {}).get("Name") if isinstance(result.get("Patient_Demographics"), dict) else None,
-                "Age": result.get("Patient_Demographics", {}).get("Age") if isinstance(result.get("Patient_Demographics"), dict) else None,
-                "Gender": result.get("Patient_Demographics", {}).get("Gender") if isinstance(result.get("Patient_Demographics"), dict) else None,
+                "Name": demographics.get("Name"),
+                "Age": demographics.get("Age"),
+                "Gender": demographics.get("Gender"),
             },
             "Chief_Complaint": result.get("Chief_Complaint") or "Not specified",
             "History_of_Present_Illness": result.get("History_of_Present_Illness") or "Not documented",
             "Symptoms": {
-                "Primary": self._ensure_list(result.get("Symptoms", {}).get("Primary") if isinstance(result.get("Symptoms"), dict) else []),
-                "Secondary": self._ensure_list(result.get("Symptoms", {}).get("Secondary") if isinstance(result.get("Symptoms"), dict) else []),
-                "Timeline": result.get("Symptoms", {}).get("Timeline") if isinstance(result.get("Symptoms"), dict) else "Not specified"
+                "Primary": ensure_list(symptoms.get("Primary")),
+                "Secondary": ensure_list(symptoms.get("Secondary")),
+                "Timeline": symptoms.get("Timeline") if symptoms_valid else "Not specified"
             },
-            "Previous_Treatments": self._ensure_list(result.get("Previous_Treatments", [])),
+            "Previous_Treatments": ensure_list(result.get("Previous_Treatments", [])),
             "Current_Status": result.get("Current_Status") or "Not specified",
             "Medical_Findings": result.get("Medical_Findings") or "Not documented",
             "Clinical_Notes": result.get("Clinical_Notes") or "Not documented"
         }
         return validated
     
-    def _ensure_list(self, value: Any) -> list:
-        """Ensure value is a list of strings"""
-        if isinstance(value, list):
-            return [str(item).strip() for item in value if item]
-        elif isinstance(value, str):
-            return [value.strip()] if value.strip() else []
-        else:
-            return []
-    
     def generate_executive_summary(self, transcript: str, max_length: int = 200) -> str:
         """
         Generate a concise executive summary of the medical encounter
@@ -103,7 +139,7 @@ Return a JSON object with this structure:
         Focus on the key medical issue, diagnosis, and outcome.
 
         Transcript:
-        {transcript}
+        {compress_transcript(transcript)}
 
         Provide a concise summary:"""
         
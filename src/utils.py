@@ -0,0 +1,169 @@
+"""
+Shared Text Utilities
+Helpers for normalizing transcripts and splitting them into model-sized pieces
+"""
+
+import re
+from typing import Any, List
+
+# Verbal fillers that carry no clinical content, removed only mid-utterance (followed by
+# more speech). Hyphenated forms ("uh-huh") and fillers that are a whole reply ("Hmm?",
+# "Um.") are kept, since they carry meaning
+_FILLER_PATTERN = re.compile(
+    r'(?<![\w-])(?:u+m+|u+h+|e+r+m+|h+m+)(?![\w-])(?:,|\.{3}|…)?[ \t]+(?=\S)',
+    re.IGNORECASE
+)
+_SPACE_RUN_PATTERN = re.compile(r'[ \t]+')
+_BLANK_RUN_PATTERN = re.compile(r'\n\s*\n\s*')
+
+# Speaker labels (lowercase, markdown stripped) that start a dialogue turn
+PATIENT_PREFIXES = ("patient:", "patient ")
+OTHER_SPEAKER_PREFIXES = ("physician:", "physician ", "doctor:", "doctor ", "dr.", "dr:", "nurse:", "[")
+SPEAKER_PREFIXES = PATIENT_PREFIXES + OTHER_SPEAKER_PREFIXES
+
+
+def normalize_transcript(transcript: str) -> str:
+    """
+    Normalize a transcript for similarity comparison
+    
+    Args:
+        transcript: Raw transcript
+    
+    Returns:
+        Lowercased transcript with whitespace runs collapsed to single spaces
+    """
+    return ' '.join(transcript.lower().split())
+
+
+def compress_transcript(transcript: str) -> str:
+    """
+    Remove verbal fillers and redundant whitespace to cut prompt tokens
+    
+    Args:
+        transcript: Raw transcript
+    
+    Returns:
+        Transcript with fillers dropped, whitespace runs collapsed and turns separated by one blank line
+    """
+    text = _FILLER_PATTERN.sub('', transcript)
+    text = _SPACE_RUN_PATTERN.sub(' ', text)
+    text = _BLANK_RUN_PATTERN.sub('\n\n', text)
+    return '\n'.join(line.strip() for line in text.split('\n')).strip()
+
+
+def ensure_list(value: Any) -> List[str]:
+    """
+    Coerce a model-returned field into a list of stripped, non-empty strings
+    
+    Args:
+        value: List, string, or any other value from a model response
+    
+    Returns:
+        List of strings (empty for missing or unsupported values)
+    """
+    if isinstance(value, list):
+        # Common case: the model already returned strings, so skip the per-item str() call
+        if all(type(item) is str for item in value):
+            return [item.strip() for item in value if item]
+        return [str(item).strip() for item in value if item]
+    if isinstance(value, str):
+        stripped = value.strip()
+        return [stripped] if stripped else []
+    return []
+
+
+def _split_turns(transcript: str) -> List[str]:
+    """Split a transcript into dialogue turns, each starting at a speaker-label line"""
+    turns = []
+    current = []
+    # splitlines also handles CRLF and lone CR line endings
+    for line in transcript.splitlines():
+        text = line.strip()
+        if text.lstrip('*').strip().lower().startswith(SPEAKER_PREFIXES) and current:
+            turns.append('\n'.join(current))
+            current = []
+        if text:
+            current.append(text)
+    if current:
+        turns.append('\n'.join(current))
+    return turns
+
+
+def _split_oversized(turn: str, max_chars: int) -> List[str]:
+    """Split a turn longer than max_chars on line, then word, boundaries"""
+    if len(turn) <= max_chars:
+        return [turn]
+    
+    pieces = []
+    current = ''
+    for line in turn.split('\n'):
+        while len(line) > max_chars:
+            cut = line.rfind(' ', 0, max_chars + 1)
+            if cut <= 0:
+                cut = max_chars
+            if current:
+                pieces.append(current)
+                current = ''
+            pieces.append(line[:cut].rstrip())
+            line = line[cut:].lstrip()
+        if current and len(current) + 1 + len(line) > max_chars:
+            pieces.append(current)
+            current = line
+        else:
+            current = current + '\n' + line if current else line
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def chunk_by_turns(transcript: str, max_chars: int = 8000, overlap: int = 400) -> List[str]:
+    """
+    Split a transcript into chunks on dialogue-turn boundaries
+    
+    Args:
+        transcript: Full conversation transcript
+        max_chars: Maximum characters per chunk
+        overlap: Approximate characters of trailing context repeated at the start of the next chunk
+    
+    Returns:
+        List of transcript chunks (a single chunk if the transcript already fits), none
+        longer than max_chars
+    """
+    if len(transcript) <= max_chars:
+        return [transcript]
+    
+    # Turns start at speaker-label lines; oversized turns are split on line/word boundaries
+    pieces = []
+    for turn in _split_turns(transcript):
+        pieces.extend(_split_oversized(turn, max_chars))
+    
+    chunks = []
+    current = []
+    current_len = 0  # len('\n\n'.join(current))
+    for piece in pieces:
+        if current and current_len + 2 + len(piece) > max_chars:
+            chunks.append('\n\n'.join(current))
+            
+            # Carry trailing pieces forward as overlap for the next chunk
+            carried = []
+            carried_len = 0
+            for previous in reversed(current):
+                extra = len(previous) + (2 if carried else 0)
+                if carried_len + extra > overlap:
+                    break
+                carried.insert(0, previous)
+                carried_len += extra
+            
+            # Drop the overlap if it would push the next chunk past max_chars
+            if carried and carried_len + 2 + len(piece) > max_chars:
+                carried, carried_len = [], 0
+            current = carried
+            current_len = carried_len
+        
+        current_len += len(piece) + (2 if current else 0)
+        current.append(piece)
+    
+    if current:
+        chunks.append('\n\n'.join(current))
+    
+    return chunks